@@ -0,0 +1,11 @@
+# ========================================
+# ▶️ Development server: `python -m backend`
+# ========================================
+# A package __main__ is never re-imported by multiprocessing children, so the
+# password-hashing processes don't run create_app() or start background threads.
+import os
+
+from backend.app import app
+
+port = int(os.environ.get("PORT", 5000))  # 5000 is local fallback
+app.run(host="0.0.0.0", port=port)
@@ -7,37 +7,106 @@
 from flask import request, jsonify, render_template, session
 from flask_cors import CORS
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
 from email.message import EmailMessage
-import smtplib, secrets
+import hmac
+import hashlib
 import os
 
 
 # Import local modules
-from backend.db_config import create_app, get_db_connection, mysql
+from backend.db_config import (create_app, get_db_connection, get_expense_db_connection, expense_schema,
+                               pool_ready, pool_stats)
+from backend import expenses
+from backend.expenses import TripDeleted
+from backend.settlement import build_summary
+from backend.money import to_major
+from backend.mailer import EmailOutbox
+from backend.hashing import PasswordHasher, HashPoolSaturated
+from backend.tokens import make_reset_token, read_reset_token, password_fingerprint
+from backend.purge import TripPurger, purge_progress
+from backend.members import MemberCache
+from backend.summary_cache import SummaryCache
+from backend import importer
+from backend import idempotency
+from backend.idempotency import IdempotencyKeyReused, ExpiredKeySweeper
+from backend.batch import run_batch, BatchOperationError
 
 # ============================
 # 🔧 Initialize Flask App
 # ============================
 app = create_app()
-CORS(app, resources={r"/*": {"origins": "*"}})  # Allow cross-origin requests (adjust for production)
-
-# Safely handle teardown
-@app.teardown_appcontext
-def teardown_db(exception):
-    try:
-        if hasattr(mysql, 'connection'):
-            mysql.connection.close()
-    except Exception as e:
-        # Log or ignore
-        print("Teardown error (ignored):", e)
-
-# Store password reset tokens temporarily (in-memory)
-reset_tokens = {}
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=["ETag"])  # Allow cross-origin requests (adjust for production)
+
+# Login DB connections are checked out lazily per request and returned
+# to the pool by the teardown hook registered in create_app()
+
+# Outgoing mail is queued and sent in the background over one reused SMTP connection
+# Local SMTP server for testing (run `python -m smtpd -c DebuggingServer -n localhost:1025`)
+outbox = EmailOutbox(
+    host=os.environ.get("SMTP_HOST", "localhost"),
+    port=int(os.environ.get("SMTP_PORT", 1025)),
+    maxsize=int(os.environ.get("EMAIL_OUTBOX_SIZE", 1000)),
+    batch_size=int(os.environ.get("EMAIL_BATCH_SIZE", 20)),
+)
+
+# Password hashing runs in a bounded process pool (fails fast with 503 when saturated)
+hasher = PasswordHasher(
+    method=os.environ.get("PASSWORD_HASH_METHOD"),  # see `python -m backend.hashing --help`
+    workers=int(os.environ.get("HASH_WORKERS", 0)) or None,  # per web worker; default: cores / WEB_CONCURRENCY
+    max_pending=int(os.environ.get("HASH_MAX_PENDING", 0)) or None,
+    web_workers=int(os.environ.get("WEB_CONCURRENCY", 1)),  # gunicorn's default --workers
+)
+
+# Trip members live in the DB (the session cookie only carries the trip id),
+# cached per process for O(1) membership checks
+members = MemberCache(
+    max_trips=int(os.environ.get("MEMBER_CACHE_TRIPS", 1024)),
+    ttl=float(os.environ.get("MEMBER_CACHE_TTL", 30)),  # seconds
+)
+
+# Computed summaries are cached per (trip, version); expense writes bump the version
+summaries = SummaryCache(max_trips=int(os.environ.get("SUMMARY_CACHE_TRIPS", 1024)))
+
+# Deleted trips are purged in the background in primary-key batches, sleeping between them
+# so lock waits and replica lag stay bounded
+purger = TripPurger(
+    batch_size=int(os.environ.get("DELETE_BATCH_SIZE", 1000)),
+    batch_sleep=float(os.environ.get("DELETE_BATCH_SLEEP", 0.05)),  # seconds
+)
+purger.ensure_started()  # resumes purges left unfinished by a previous process
+os.register_at_fork(after_in_child=purger.ensure_started)
+
+# Expense writes may carry an Idempotency-Key; replays return the stored response.
+# Expired keys are swept in the background, outside the writes' transactions.
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", 24 * 3600))  # seconds
+key_sweeper = ExpiredKeySweeper(
+    get_expense_db_connection,
+    interval=float(os.environ.get("IDEMPOTENCY_SWEEP_INTERVAL", 60)),  # seconds
+)
+key_sweeper.ensure_started()
+os.register_at_fork(after_in_child=key_sweeper.ensure_started)
+
+# Reset tokens are signed and self-expiring (no server-side store)
+RESET_TOKEN_MAX_AGE = int(os.environ.get("RESET_TOKEN_MAX_AGE", 3600))  # seconds
 
 # ==============================
 # 🌐 Global Error Handler
 # ==============================
+@app.errorhandler(HashPoolSaturated)
+def handle_hash_pool_saturated(e):
+    print(f"⏳ Hash pool saturated: {e}")
+    return jsonify({"success": False, "error": "Server is busy, please try again."}), 503, {"Retry-After": "1"}
+
+@app.errorhandler(IdempotencyKeyReused)
+def handle_idempotency_key_reused(e):
+    return jsonify({"success": False, "error": str(e)}), 422
+
+@app.errorhandler(TripDeleted)
+def handle_trip_deleted(e):
+    # Deleted from another session: the next request resolves the owner's live trip
+    session.pop('trip_id', None)
+    return jsonify({"success": False, "error": str(e), "trip_deleted": True}), 409
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     print(f"❌ Uncaught Exception: {e}")
@@ -54,6 +123,86 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ==============================================
+# 🧳 Current Trip (every expense query is scoped to it)
+# ==============================================
+def current_trip_id():
+    """Returns the session's trip id, resolving the owner's latest trip for older sessions."""
+    trip_id = session.get('trip_id')
+    if trip_id is None:
+        trip_id = load_trip_for(session['user_email'])
+        session['trip_id'] = trip_id
+    return trip_id
+
+def load_trip_for(email, login_conn=None):
+    """
+    Resolves the owner's live trip. Pass the request's login connection when the
+    route already holds it: it is switched to the expense schema for the lookup
+    rather than checking out a second connection from the same pool.
+    """
+    if login_conn is not None:
+        with expense_schema(login_conn) as conn:
+            return _get_or_create_trip(conn, email)
+    conn = get_expense_db_connection()
+    if conn is None:
+        raise RuntimeError("Expense DB unavailable.")
+    try:
+        return _get_or_create_trip(conn, email)
+    finally:
+        conn.close()
+
+def _get_or_create_trip(conn, email):
+    cursor = conn.cursor()
+    try:
+        trip_id = expenses.get_or_create_trip(cursor, email)
+        conn.commit()
+        return trip_id
+    finally:
+        cursor.close()
+
+# ==============================================
+# 🏷️ Conditional GET (strong ETags, 304 before any work)
+# ==============================================
+def not_modified(etag):
+    """Returns a 304 response if the client already holds `etag`, else None."""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        return with_etag(response, etag)
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"  # always revalidate
+    return response
+
+# ==============================================
+# 🔁 Idempotent Writes (Idempotency-Key header)
+# ==============================================
+def replay_idempotent(cursor):
+    """
+    Claims the request's Idempotency-Key (if any) in the cursor's transaction.
+    Returns the stored response when this is a replay, else None.
+    """
+    key = request.headers.get(idempotency.HEADER)
+    if key is None:
+        return None
+    fingerprint = idempotency.request_fingerprint(request.method, request.path, request.get_data())
+    stored = idempotency.claim(cursor, session['user_email'], key.strip(), fingerprint, IDEMPOTENCY_TTL)
+    if stored is None:
+        return None
+    status_code, body = stored
+    response = jsonify(body)
+    response.status_code = status_code
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+def remember_response(cursor, body, status_code=200):
+    """Stores the response under the request's Idempotency-Key (if any); commit afterwards."""
+    key = request.headers.get(idempotency.HEADER)
+    if key is not None:
+        idempotency.store(cursor, session['user_email'], key.strip(), status_code, body)
+    return jsonify(body), status_code
+
 # ==================
 # 📄 Serve Homepage
 # ==================
@@ -62,11 +211,31 @@ def index():
     return render_template('index.html')
 
 
+# ==========================================
+# 🩺 Readiness Probe (pool warmed up?)
+# ==========================================
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    if pool_ready():
+        return jsonify({"ready": True, "pool": pool_stats()})
+    return jsonify({"ready": False, "pool": pool_stats()}), 503
+
+
+# ==========================================
+# 📈 Runtime Metrics (outbox depth, latencies)
+# ==========================================
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({"outbox": outbox.metrics(), "hashing": hasher.metrics(), "db_pool": pool_stats(),
+                    "summary_cache": summaries.metrics()})
+
+
 # ==================================
 # 👤 User Registration API [POST]
 # ==================================
 @app.route('/register', methods=['POST'])
 def register():
+    cursor = None
     try:
         data = request.get_json()
         name = data.get('name', '').strip()
@@ -76,7 +245,7 @@ def register():
         if not all([name, email, password]):
             return jsonify({"success": False, "error": "All fields are required."}), 400
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hasher.hash(password)
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -91,13 +260,16 @@ def register():
         print(f"✅ Registered user: {email}")
         return jsonify({"success": True})
 
+    except HashPoolSaturated:
+        raise  # answered with 503 by handle_hash_pool_saturated
+
     except Exception as e:
         print("❌ Register Error:", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
 
 
 # ==================================
@@ -105,6 +277,7 @@ def register():
 # ==================================
 @app.route('/login', methods=['POST'])
 def login():
+    cursor = None
     try:
         data = request.get_json()
         email = data.get('email', '').strip()
@@ -117,22 +290,26 @@ def login():
         cursor.execute("SELECT password_hash FROM login_users_emt WHERE email = %s", (email,))
         result = cursor.fetchone()
 
-        if result and check_password_hash(result[0], password):
+        if result and hasher.verify(result[0], password):
+            rehash_password_if_outdated(cursor, email, result[0], password)
             session['user_email'] = email
-            session['trip_users'] = []
+            session['trip_id'] = load_trip_for(email, conn)
             print(f"✅ Login successful: {email}")
             return jsonify({"success": True})
         else:
             print(f"❌ Login failed for: {email}")
             return jsonify({"success": False, "error": "Invalid credentials."})
 
+    except HashPoolSaturated:
+        raise  # answered with 503 by handle_hash_pool_saturated
+
     except Exception as e:
         print("❌ Login Error:", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
 
 
 # ========================
@@ -146,55 +323,463 @@ def logout():
 
 
 # ======================================
-# ➕ Add User to Trip Session [Protected]
+# ➕ Add Member to Current Trip [Protected]
 # ======================================
 @app.route('/add_user', methods=['POST'])
 @login_required
 def add_user():
+    conn = None
+    cursor = None
+    trip_id = None
     try:
-        data = request.get_json()
-        name = data.get("name", "").strip()
-
-        if not name:
-            return jsonify({"success": False, "error": "Name is required."}), 400
-
-        if 'trip_users' not in session:
-            session['trip_users'] = []
+        data = request.get_json() or {}
+        name = str(data.get("name", "")).strip()
+        expenses.check_member_name(name)
+
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
 
-        if name in session['trip_users']:
+        if not members.add(cursor, trip_id, name):
             return jsonify({"success": False, "error": "User already added."}), 400
+        conn.commit()
 
-        session['trip_users'].append(name)
-        session.modified = True
         print(f"➕ Added trip user: {name}")
-
         return jsonify({"success": True})
 
+    except TripDeleted:
+        raise  # answered with 409 by handle_trip_deleted
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
     except Exception as e:
         print("❌ Add User Error:", e)
+        if conn:
+            conn.rollback()
+        if trip_id is not None:
+            members.invalidate(trip_id)
         return jsonify({"success": False, "error": str(e)}), 500
 
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
 
 # ======================================
-# 👥 Get Trip Users in Session [Protected]
+# 👥 Get Members of Current Trip [Protected]
 # ======================================
 @app.route('/users', methods=['GET'])
 @login_required
 def get_users():
+    conn = None
+    cursor = None
     try:
-        users = session.get('trip_users', [])
-        return jsonify([{"name": name} for name in users])
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
+
+        names = members.names(cursor, trip_id)
+        etag = f"u{trip_id}-" + hashlib.sha256("\n".join(names).encode()).hexdigest()[:32]
+        return not_modified(etag) or with_etag(jsonify([{"name": name} for name in names]), etag)
+
+    except TripDeleted:
+        raise  # answered with 409 by handle_trip_deleted
 
     except Exception as e:
         print("❌ Get Users Error:", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# ==========================================
+# 💸 Add Expense (single transaction) [Protected]
+# ==========================================
+@app.route('/add_expense', methods=['POST'])
+@login_required
+def add_expense():
+    conn = None
+    cursor = None
+    try:
+        data = request.get_json() or {}
+        expense = expenses.parse_expense(data)
+
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
+
+        replay = replay_idempotent(cursor)
+        if replay:
+            conn.rollback()
+            return replay
+
+        members.require(cursor, trip_id, [expense["paid_by"], *expense["shares"]])
+        expense_id = expenses.add_expense(cursor, trip_id, expense)
+        response = remember_response(cursor, {"success": True, "expense_id": expense_id})
+        conn.commit()
+        summaries.invalidate(trip_id)
+
+        print(f"💸 Added expense #{expense_id}: {expense['title']} ({len(expense['shares'])} shares)")
+        return response
+
+    except IdempotencyKeyReused:
+        raise  # answered with 422 by handle_idempotency_key_reused
+
+    except TripDeleted:
+        raise  # answered with 409 by handle_trip_deleted
+
+    except ValueError as e:
+        if conn:
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    except Exception as e:
+        print("❌ Add Expense Error:", e)
+        if conn:
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# ==========================================
+# 📥 Bulk Import Expenses (streamed CSV / NDJSON) [Protected]
+# ==========================================
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 500))
+
+@app.route('/import_expenses', methods=['POST'])
+@login_required
+def import_expenses():
+    conn = None
+    trip_id = None
+    try:
+        content_type = request.mimetype
+        if content_type not in ("text/csv", "application/x-ndjson", "application/ndjson"):
+            return jsonify({"success": False, "error": "Send text/csv or application/x-ndjson."}), 415
+
+        # Parsed line by line straight off the socket; the body is never buffered whole
+        lines = importer.iter_lines(request.stream)
+        rows = importer.iter_csv(lines) if content_type == "text/csv" else importer.iter_ndjson(lines)
+
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+
+        report = importer.import_expenses(conn, trip_id, rows, batch_size=IMPORT_BATCH_SIZE)
+
+        print(f"📥 Imported {report['imported']} expense(s) into trip #{trip_id} "
+              f"({report['failed']} failed, {report['rows_per_second']} rows/s)")
+        return jsonify({"success": "aborted" not in report, **report})
+
+    except TripDeleted:
+        raise  # answered with 409 by handle_trip_deleted
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    except Exception as e:
+        print("❌ Import Expenses Error:", e)
+        if conn:
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if trip_id is not None:
+            members.invalidate(trip_id)  # imports create missing members
+            summaries.invalidate(trip_id)
+        if conn:
+            conn.close()
+
+
+# ==========================================
+# 🗑️ Delete One Expense [Protected]
+# ==========================================
+@app.route('/delete_expense', methods=['POST'])
+@login_required
+def delete_expense():
+    conn = None
+    cursor = None
+    try:
+        data = request.get_json() or {}
+        expense_id = data.get("expense_id")
+        if not isinstance(expense_id, int):
+            return jsonify({"success": False, "error": "expense_id is required."}), 400
+
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
+
+        replay = replay_idempotent(cursor)
+        if replay:
+            conn.rollback()
+            return replay
+
+        if not expenses.delete_expense(cursor, trip_id, expense_id):
+            return jsonify({"success": False, "error": "Expense not found."}), 404
+        response = remember_response(cursor, {"success": True})
+        conn.commit()
+        summaries.invalidate(trip_id)
+
+        print(f"🗑️ Deleted expense #{expense_id}")
+        return response
+
+    except IdempotencyKeyReused:
+        raise  # answered with 422 by handle_idempotency_key_reused
+
+    except TripDeleted:
+        raise  # answered with 409 by handle_trip_deleted
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    except Exception as e:
+        print("❌ Delete Expense Error:", e)
+        if conn:
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# ==========================================
+# 📦 Batch Operations (one transaction) [Protected]
+# ==========================================
+BATCH_MAX_OPERATIONS = int(os.environ.get("BATCH_MAX_OPERATIONS", 500))
+
+@app.route('/batch', methods=['POST'])
+@login_required
+def batch():
+    conn = None
+    cursor = None
+    trip_id = None
+    try:
+        data = request.get_json() or {}
+        operations = data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return jsonify({"success": False, "error": "operations must be a non-empty list."}), 400
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return jsonify({"success": False,
+                            "error": f"At most {BATCH_MAX_OPERATIONS} operations per batch."}), 400
+
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
+
+        replay = replay_idempotent(cursor)
+        if replay:
+            conn.rollback()
+            return replay
+
+        results = run_batch(cursor, trip_id, operations)
+        response = remember_response(cursor, {"success": True, "results": results})
+        conn.commit()
+        members.invalidate(trip_id)
+        summaries.invalidate(trip_id)
+
+        print(f"📦 Ran batch of {len(operations)} operation(s) on trip #{trip_id}")
+        return response
+
+    except IdempotencyKeyReused:
+        raise  # answered with 422 by handle_idempotency_key_reused
+
+    except TripDeleted:
+        raise  # answered with 409 by handle_trip_deleted
+
+    except BatchOperationError as e:
+        if conn:
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e), "failed_index": e.index}), 400
+
+    except ValueError as e:
+        if conn:
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    except Exception as e:
+        print("❌ Batch Error:", e)
+        if conn:
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# ==========================================
+# 🧹 Delete Trip History (soft delete + background purge) [Protected]
+# ==========================================
+@app.route('/delete_history', methods=['POST'])
+@login_required
+def delete_history():
+    conn = None
+    cursor = None
+    try:
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
+
+        # Mark the trip deleted and start the owner on a fresh one; rows go in the background
+        purger.request(cursor, trip_id)
+        new_trip_id = expenses.get_or_create_trip(cursor, session['user_email'])
+        conn.commit()
+        purger.notify(trip_id)
+
+        session['trip_id'] = new_trip_id
+        members.invalidate(trip_id)
+        summaries.invalidate(trip_id)
+
+        print(f"🧹 Trip #{trip_id} deleted, purge queued")
+        return jsonify({"success": True, "purging_trip_id": trip_id}), 202
+
+    except Exception as e:
+        print("❌ Delete History Error:", e)
+        if conn:
+            conn.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+@app.route('/delete_history/status', methods=['GET'])
+@login_required
+def delete_history_status():
+    conn = None
+    cursor = None
+    try:
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
+
+        return jsonify({"success": True, "purges": purge_progress(cursor, session['user_email'])})
+
+    except Exception as e:
+        print("❌ Delete History Status Error:", e)
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# ==========================================
+# 📊 Expense Summary & Settlements [Protected]
+# ==========================================
+@app.route('/summary', methods=['GET'])
+@login_required
+def summary():
+    conn = None
+    cursor = None
+    try:
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
+
+        # Version and totals are read in one transaction, so they come from the same snapshot
+        version = expenses.fetch_trip_version(cursor, trip_id)
+        if version is None:
+            session.pop('trip_id', None)  # deleted from another session; re-resolved next request
+            return jsonify(build_summary({}))
+
+        etag = f"s{trip_id}-v{version}"
+        response = not_modified(etag)
+        if response:
+            return response
+
+        result = summaries.get(trip_id, version)
+        if result is None:
+            result = build_summary(expenses.fetch_member_totals(cursor, trip_id))
+            summaries.put(trip_id, version, result)
+        return with_etag(jsonify(result), etag)
+
+    except Exception as e:
+        print("❌ Summary Error:", e)
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# ==========================================
+# 🔗 Pairwise Totals (who owes whom) [Protected]
+# ==========================================
+@app.route('/pairwise_totals', methods=['GET'])
+@login_required
+def pairwise_totals():
+    conn = None
+    cursor = None
+    try:
+        trip_id = current_trip_id()
+        conn = get_expense_db_connection()
+        if conn is None:
+            return jsonify({"success": False, "error": "Database unavailable."}), 503
+        cursor = conn.cursor()
+
+        rows = expenses.fetch_pairwise_totals(cursor, trip_id)
+        return jsonify([
+            {"payer_name": payer, "receiver_name": receiver, "total_owed": to_major(owed_cents)}
+            for payer, receiver, owed_cents in rows
+        ])
+
+    except Exception as e:
+        print("❌ Pairwise Totals Error:", e)
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
 
 # ========================================
 # 📩 Forgot Password - Send Email [POST]
 # ========================================
 @app.route('/forgot_password', methods=['POST'])
 def forgot_password():
+    cursor = None
     try:
         data = request.get_json()
         email = data.get("email", "").strip()
@@ -204,30 +789,29 @@ def forgot_password():
 
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT email FROM login_users_emt WHERE email = %s", (email,))
+        cursor.execute("SELECT password_hash FROM login_users_emt WHERE email = %s", (email,))
         result = cursor.fetchone()
 
         if not result:
             return jsonify({"success": False, "error": "Email not registered."}), 404
 
-        # Generate and store token
-        token = secrets.token_urlsafe(32)
-        reset_tokens[token] = email
+        # Signed token bound to the current password (single use: it dies once the hash changes)
+        token = make_reset_token(app.secret_key, email, result[0])
 
-        # Send reset email
+        # Queue reset email (delivered in the background)
         if send_reset_email(email, token):
-            print(f"📧 Reset email sent to {email}")
+            print(f"📧 Reset email queued for {email}")
             return jsonify({"success": True})
         else:
-            return jsonify({"success": False, "error": "Email sending failed."}), 500
+            return jsonify({"success": False, "error": "Email service busy, please try again."}), 503
 
     except Exception as e:
         print("❌ Forgot Password Error:", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
 
 
 # ========================================
@@ -235,6 +819,7 @@ def forgot_password():
 # ========================================
 @app.route('/reset_password', methods=['POST'])
 def reset_password():
+    cursor = None
     try:
         data = request.get_json()
         token = data.get("token", "").strip()
@@ -243,34 +828,72 @@ def reset_password():
         if not token or not new_password:
             return jsonify({"success": False, "error": "Token and new password are required."}), 400
 
-        email = reset_tokens.get(token)
-        if not email:
+        claims = read_reset_token(app.secret_key, token, RESET_TOKEN_MAX_AGE)
+        if not claims:
             return jsonify({"success": False, "error": "Invalid or expired token."}), 400
-
-        hashed = generate_password_hash(new_password)
+        email, fingerprint = claims
 
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE login_users_emt SET password_hash = %s WHERE email = %s", (hashed, email))
+        cursor.execute("SELECT password_hash FROM login_users_emt WHERE email = %s", (email,))
+        result = cursor.fetchone()
+
+        # Token was issued for a password that has since changed (or a deleted account)
+        if not result or not hmac.compare_digest(password_fingerprint(result[0]), fingerprint):
+            return jsonify({"success": False, "error": "Invalid or expired token."}), 400
+
+        hashed = hasher.hash(new_password)
+
+        # Compare-and-set so the same token can't be redeemed twice concurrently
+        cursor.execute(
+            "UPDATE login_users_emt SET password_hash = %s WHERE email = %s AND password_hash = %s",
+            (hashed, email, result[0])
+        )
+        if cursor.rowcount != 1:
+            conn.rollback()
+            return jsonify({"success": False, "error": "Invalid or expired token."}), 400
         conn.commit()
 
         print(f"🔑 Password reset successful for {email}")
-        reset_tokens.pop(token, None)  # Clear used token
         return jsonify({"success": True})
 
+    except HashPoolSaturated:
+        raise  # answered with 503 by handle_hash_pool_saturated
+
     except Exception as e:
         print("❌ Reset Password Error:", e)
         return jsonify({"success": False, "error": str(e)}), 500
 
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
+
+
+# ===========================================
+# 🔁 Utility: Upgrade Outdated Password Hashes
+# ===========================================
+def rehash_password_if_outdated(cursor, email, stored_hash, password):
+    """Re-hash with the configured method after a successful login; never fails the login."""
+    try:
+        if not hasher.needs_rehash(stored_hash):
+            return
+        new_hash = hasher.hash(password)
+        # Only replace the hash we verified against (a concurrent reset wins)
+        cursor.execute(
+            "UPDATE login_users_emt SET password_hash = %s WHERE email = %s AND password_hash = %s",
+            (new_hash, email, stored_hash)
+        )
+        get_db_connection().commit()
+        print(f"🔐 Upgraded password hash for {email}")
+    except Exception as e:
+        print("⚠️ Password rehash skipped:", e)
 
 
 # ================================
-# 📬 Utility: Send Reset Email
+# 📬 Utility: Queue Reset Email
 # ================================
 def send_reset_email(email, token):
+    """Queues the reset email; returns False if the outbox is full."""
     try:
         msg = EmailMessage()
         msg.set_content(f"""
@@ -286,11 +909,7 @@ If you didn’t request this, please ignore this email.
         msg['From'] = "noreply@expensetool.com"
         msg['To'] = email
 
-        # Local SMTP server for testing (run `python -m smtpd -c DebuggingServer -n localhost:1025`)
-        with smtplib.SMTP('localhost', 1025) as smtp:
-            smtp.send_message(msg)
-
-        return True
+        return outbox.enqueue(msg)
 
     except Exception as e:
         print("❌ Email sending error:", e)
@@ -300,6 +919,5 @@ If you didn’t request this, please ignore this email.
 # ========================
 # ▶️ Run the Flask App
 # ========================
-if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 5000))  # 5000 is local fallback
-    app.run(host="0.0.0.0", port=port)
+# `python -m backend` (backend/__main__.py). Running this module as __main__ would make
+# every password-hashing process re-import it, with its pools and background threads.
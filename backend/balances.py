@@ -0,0 +1,118 @@
+"""
+Per-member paid/owed totals in integer cents.
+
+Rows are pulled as columns and reduced with NumPy when it is installed;
+a pure-Python path produces identical results without it.
+Benchmark both: `python -m backend.balances --shares 500000`
+"""
+import time
+import random
+import argparse
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+
+def _totals_numpy(payer_ids, paid_cents, member_ids, owed_cents):
+    payer_ids = np.asarray(payer_ids, dtype=np.int64)
+    member_ids = np.asarray(member_ids, dtype=np.int64)
+
+    # Compact sparse user ids to 0..k-1 so the accumulators stay small
+    ids, inverse = np.unique(np.concatenate([payer_ids, member_ids]), return_inverse=True)
+    inverse = inverse.reshape(-1)  # NumPy 2.0 returns it in the input's shape
+    paid_idx, owed_idx = inverse[:len(payer_ids)], inverse[len(payer_ids):]
+
+    # Unbuffered integer adds: cents stay int64 end to end (bincount would sum in float64)
+    paid = np.zeros(len(ids), dtype=np.int64)
+    owed = np.zeros(len(ids), dtype=np.int64)
+    np.add.at(paid, paid_idx, np.asarray(paid_cents, dtype=np.int64))
+    np.add.at(owed, owed_idx, np.asarray(owed_cents, dtype=np.int64))
+
+    return {
+        int(user_id): (int(p), int(o))
+        for user_id, p, o in zip(ids.tolist(), paid.tolist(), owed.tolist())
+    }
+
+
+def _totals_python(payer_ids, paid_cents, member_ids, owed_cents):
+    totals = {}
+    for user_id, cents in zip(payer_ids, paid_cents):
+        paid, owed = totals.get(user_id, (0, 0))
+        totals[user_id] = (paid + cents, owed)
+    for user_id, cents in zip(member_ids, owed_cents):
+        paid, owed = totals.get(user_id, (0, 0))
+        totals[user_id] = (paid, owed + cents)
+    return totals
+
+
+def member_totals(payer_ids, paid_cents, member_ids, owed_cents, use_numpy=None):
+    """
+    Columns in, {user_id: (paid_cents, owed_cents)} out.
+    payer_ids/paid_cents come from expenses, member_ids/owed_cents from expense_shares.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy and len(payer_ids) + len(member_ids):
+        return _totals_numpy(payer_ids, paid_cents, member_ids, owed_cents)
+    return _totals_python(payer_ids, paid_cents, member_ids, owed_cents)
+
+
+def fetch_columns(cursor, query, params=(), width=2):
+    """Runs an integer-only query and returns its `width` columns as lists (or int64 arrays)."""
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    if np is not None:
+        data = np.array(rows, dtype=np.int64).reshape(len(rows), width)
+        return tuple(data[:, i] for i in range(width))
+    return tuple([row[i] for row in rows] for i in range(width))
+
+
+def merge_totals(into, totals):
+    """Adds one {user_id: (paid, owed)} chunk result into another, in place."""
+    for user_id, (paid, owed) in totals.items():
+        old_paid, old_owed = into.get(user_id, (0, 0))
+        into[user_id] = (old_paid + paid, old_owed + owed)
+    return into
+
+
+# ---------- benchmark CLI ----------
+
+def _synthetic(members, shares, seed=7):
+    rng = random.Random(seed)
+    expenses = max(shares // max(members // 2, 1), 1)
+    payer_ids = [rng.randrange(1, members + 1) for _ in range(expenses)]
+    paid_cents = [rng.randrange(100, 500_000) for _ in range(expenses)]
+    member_ids = [rng.randrange(1, members + 1) for _ in range(shares)]
+    owed_cents = [rng.randrange(1, 50_000) for _ in range(shares)]
+    return payer_ids, paid_cents, member_ids, owed_cents
+
+
+def _best_of(fn, args, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare NumPy and pure-Python balance computation.")
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--shares", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    columns = _synthetic(args.members, args.shares)
+    py_time, py_result = _best_of(_totals_python, columns, args.repeat)
+    print(f"pure python : {py_time * 1000:9.1f} ms  ({args.shares} shares, {args.members} members)")
+
+    if np is None:
+        print("numpy       : not installed")
+    else:
+        arrays = [np.asarray(col, dtype=np.int64) for col in columns]
+        np_time, np_result = _best_of(_totals_numpy, arrays, args.repeat)
+        assert np_result == py_result, "NumPy and pure-Python totals differ"
+        print(f"numpy       : {np_time * 1000:9.1f} ms  ({py_time / np_time:.1f}x faster)")
@@ -0,0 +1,75 @@
+"""
+/batch: an ordered list of member adds and expense writes run in one transaction.
+
+    {"operations": [
+        {"op": "add_members", "names": ["Alice", "Bob"]},
+        {"op": "add_expense", "title": ..., "amount": ..., "paid_by": ..., "distribution": ...},
+        {"op": "delete_expense", "expense_id": 42}
+    ]}
+
+Operations run in order on the caller's cursor, so an expense may use members
+added earlier in the same batch. Like the rest of the data access layer this
+never commits; the first invalid operation raises BatchOperationError and the
+caller rolls the whole batch back.
+"""
+from backend import expenses
+
+OPERATIONS = ("add_members", "add_expense", "delete_expense")
+
+
+class BatchOperationError(ValueError):
+    """An operation was invalid; `index` is its position in the batch."""
+
+    def __init__(self, index, message):
+        super().__init__(f"Operation {index}: {message}")
+        self.index = index
+
+
+def run_batch(cursor, trip_id, operations):
+    """Runs the operations in order and returns one result dict per operation."""
+    members = set(expenses.fetch_member_names(cursor, trip_id))
+    results = []
+    for index, operation in enumerate(operations):
+        try:
+            results.append(_run_one(cursor, trip_id, operation, members))
+        except expenses.TripDeleted:
+            raise  # the whole batch is moot, not this operation
+        except ValueError as e:
+            raise BatchOperationError(index, str(e)) from e
+    return results
+
+
+def _run_one(cursor, trip_id, operation, members):
+    op = operation.get("op") if isinstance(operation, dict) else None
+    if op not in OPERATIONS:
+        raise ValueError(f"op must be one of {', '.join(OPERATIONS)}.")
+
+    if op == "add_members":
+        names = operation.get("names")
+        if not isinstance(names, list):
+            raise ValueError("names must be a list.")
+        names = list(dict.fromkeys(str(name).strip() for name in names))
+        for name in names:
+            expenses.check_member_name(name)
+        added = []
+        for name in names:
+            if name in members:
+                continue
+            # The insert itself decides: the unique key also matches case/accent variants
+            if expenses.add_member(cursor, trip_id, name):
+                added.append(name)
+            elif expenses.find_member_name(cursor, trip_id, name) != name:
+                raise ValueError(f"'{name}' differs only in case or accents from an existing member.")
+            members.add(name)  # inserted, or added by another request since the batch began
+        return {"op": op, "added": added, "existing": [name for name in names if name not in added]}
+
+    if op == "add_expense":
+        expense = expenses.parse_expense(operation, members=members)
+        return {"op": op, "expense_id": expenses.add_expense(cursor, trip_id, expense)}
+
+    expense_id = operation.get("expense_id")
+    if not isinstance(expense_id, int):
+        raise ValueError("expense_id is required.")
+    if not expenses.delete_expense(cursor, trip_id, expense_id):
+        raise ValueError(f"Expense #{expense_id} not found.")
+    return {"op": op, "expense_id": expense_id}
@@ -0,0 +1,64 @@
+"""
+Consistency check for the incrementally maintained user_balances table.
+
+    python -m backend.check_balances [--chunk-size 50000] [--fix]
+
+Recomputes every member's totals from expenses / expense_shares in primary-key
+chunks inside one consistent snapshot and reports any drift. --fix refuses to
+run while an archive table (`python -m backend.partitions archive`) holds rows
+of a live trip: those rows are in the totals but not in the recomputation.
+"""
+import sys
+import argparse
+
+from backend.db_config import create_app, get_expense_db_connection
+from backend import expenses
+from backend.partitions import list_archives, has_live_trip_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report (and optionally repair) user_balances drift.")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--fix", action="store_true",
+                        help="overwrite drifted rows with recomputed totals (pause expense writes first)")
+    args = parser.parse_args(argv)
+
+    create_app()
+    conn = get_expense_db_connection()
+    if conn is None:
+        print("❌ Expense DB unavailable.")
+        return 2
+
+    cursor = conn.cursor()
+    try:
+        if args.fix:
+            live = [table for table in list_archives(cursor) if has_live_trip_rows(cursor, table)]
+            if live:
+                print(f"❌ Not fixing: archived rows of live trips would be dropped from their totals "
+                      f"({', '.join(live)}).")
+                return 2
+
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        drift = expenses.check_balances(cursor, args.chunk_size)
+
+        for trip_id, user_id, s_paid, a_paid, s_owed, a_owed in drift:
+            print(f"⚠️ trip {trip_id} member {user_id}: paid {s_paid / 100:.2f} (actual {a_paid / 100:.2f}), "
+                  f"owed {s_owed / 100:.2f} (actual {a_owed / 100:.2f})")
+
+        if drift and args.fix:
+            expenses.rebuild_balances(cursor, drift)
+            conn.commit()
+            print(f"🔧 Repaired {len(drift)} balance row(s).")
+        else:
+            conn.rollback()
+
+        print("✅ No drift." if not drift else f"Drifted rows: {len(drift)}")
+        return 1 if drift and not args.fix else 0
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
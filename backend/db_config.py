@@ -1,61 +1,327 @@
 from dotenv import load_dotenv
 import os
-import mysql.connector
-from flask import Flask
-from flask_mysqldb import MySQL
+import time
+import threading
+from contextlib import contextmanager
+import mysql.connector as mysql_connector
+from flask import Flask, g, session, has_request_context
+
+from backend.pool import ConnectionPool, PoolExhausted
 
 # Load .env variables
 load_dotenv()
 
-# Initialize Flask-MySQLdb instance
-mysql = MySQL()
+# Shared pool for the login and expense schemas (configured once in create_app)
+_pool = None
+_replica_pool = None  # optional read replica
+_replica_sticky_seconds = 0
+_replica_retry_seconds = 0
+_replica_down_until = 0.0  # monotonic time; reads skip the replica until then after a failure
+_login_schema = None
+_expense_schema = None
+
+
+_READ_VERBS = ('SELECT', 'SHOW', 'EXPLAIN', 'DESCRIBE', 'DESC')
+
+
+def is_read_only(statement):
+    """True for statements that can safely run on a replica (no locking reads)."""
+    head = statement.lstrip(' \t\r\n(').split(None, 1)
+    if not head or head[0].upper() not in _READ_VERBS:
+        return False
+    upper = statement.upper()
+    return 'FOR UPDATE' not in upper and 'LOCK IN SHARE MODE' not in upper and 'FOR SHARE' not in upper
+
+
+class RoutingCursor:
+    """Cursor that runs each statement on the replica or the primary, as RoutingConnection decides."""
+
+    def __init__(self, conn, cursor_args, cursor_kwargs):
+        self._conn = conn
+        self._args = cursor_args
+        self._kwargs = cursor_kwargs
+        self._cursors = {}
+        self._current = None
+
+    def _cursor_for(self, target):
+        cursor = self._cursors.get(target)
+        if cursor is None:
+            cursor = self._conn._connection(target).cursor(*self._args, **self._kwargs)
+            self._cursors[target] = cursor
+        self._current = cursor
+        return cursor
+
+    def execute(self, statement, params=None):
+        return self._cursor_for(self._conn._route(statement)).execute(statement, params)
+
+    def executemany(self, statement, seq_params):
+        return self._cursor_for(self._conn._route(statement)).executemany(statement, seq_params)
+
+    def __getattr__(self, name):
+        # fetchone/fetchall/rowcount/lastrowid/... come from the last cursor used
+        if self._current is None:
+            raise AttributeError(name)
+        return getattr(self._current, name)
+
+    def close(self):
+        for cursor in self._cursors.values():
+            cursor.close()
+        self._cursors.clear()
+
+
+class RoutingConnection:
+    """
+    Connection facade over a primary and a read replica.
+    Read-only statements go to the replica; everything else goes to the primary.
+    After a write (in this connection or earlier in the request/session window)
+    reads also go to the primary, so callers always read their own writes.
+    Both underlying connections are checked out lazily. If the replica can't be
+    reached, reads use the primary for DB_REPLICA_RETRY_SECONDS before trying it again.
+    """
+
+    def __init__(self, schema):
+        self._schema = schema
+        self._primary = None
+        self._replica = None
+        self._wrote = False
+
+    def _route(self, statement):
+        if is_read_only(statement) and not self._pinned_to_primary():
+            return 'replica'
+        self._mark_written()
+        return 'primary'
+
+    def _pinned_to_primary(self):
+        if self._wrote:
+            return True
+        if has_request_context():
+            return g.get('_db_wrote', False) or session.get('_db_primary_until', 0) > time.time()
+        return False
+
+    def _mark_written(self):
+        self._wrote = True
+        if has_request_context() and not g.get('_db_wrote'):
+            g._db_wrote = True
+            if _replica_sticky_seconds:
+                # Keep this client on the primary until the replica has caught up
+                session['_db_primary_until'] = time.time() + _replica_sticky_seconds
+
+    def _connection(self, target):
+        global _replica_down_until
+        if target == 'replica':
+            if self._replica is None:
+                if time.monotonic() < _replica_down_until:
+                    return self._connection('primary')
+                try:
+                    self._replica = _replica_pool.acquire(self._schema)
+                except Exception as e:
+                    # Don't make every request wait out a connect or pool timeout while it's down
+                    _replica_down_until = time.monotonic() + _replica_retry_seconds
+                    print(f"[DB ERROR] Replica unavailable, reading from primary "
+                          f"for {_replica_retry_seconds}s: {e}")
+                    return self._connection('primary')
+            return self._replica
+        if self._primary is None:
+            self._primary = _require_pool().acquire(self._schema)
+        return self._primary
+
+    def use(self, schema):
+        """Switch the default schema of this connection (and of any connection already held)."""
+        self._schema = schema
+        for conn in (self._primary, self._replica):
+            if conn is not None:
+                conn.use(schema)
+        return self
+
+    def cursor(self, *args, **kwargs):
+        return RoutingCursor(self, args, kwargs)
+
+    def commit(self):
+        if self._primary is not None:
+            self._primary.commit()
+
+    def rollback(self):
+        if self._primary is not None:
+            self._primary.rollback()
+
+    def close(self):
+        for conn in (self._primary, self._replica):
+            if conn is not None:
+                conn.close()
+        self._primary = self._replica = None
+
 
 def create_app():
+    global _pool, _replica_pool, _replica_sticky_seconds, _replica_retry_seconds, _login_schema, _expense_schema
+
     app = Flask(__name__)
     app.secret_key = os.getenv('FLASK_SECRET_KEY', 'fallback_secret')
 
-    # Primary login DB config (Flask-MySQLdb)
+    # DB config: login schema + expense schema on the same host
     app.config['MYSQL_HOST'] = os.getenv('DB_HOST')
     app.config['MYSQL_PORT'] = int(os.getenv('DB_PORT', 3306))
     app.config['MYSQL_USER'] = os.getenv('DB_USER')
     app.config['MYSQL_PASSWORD'] = os.getenv('DB_PASSWORD')
     app.config['MYSQL_DB'] = os.getenv('DB_NAME') # e.g., login_system_emt
-    app.config['MYSQL_SECOND_DB'] = os.getenv('DB_NAME_EXPENSE') 
+    app.config['MYSQL_SECOND_DB'] = os.getenv('DB_NAME_EXPENSE')
 
     # Optional: Use SSL certificate for secure connection (Aiven)
     ca_path = os.path.join(os.path.dirname(__file__), 'ca.pem')
     if os.path.exists(ca_path):
         app.config['MYSQL_SSL_CA'] = ca_path
 
-    # Initialize Flask-MySQLdb
-    mysql.init_app(app)
+    # DB pool sizing (seconds for timeouts)
+    app.config['DB_POOL_MIN'] = int(os.getenv('DB_POOL_MIN', 1))
+    app.config['DB_POOL_MAX'] = int(os.getenv('DB_POOL_MAX', 10))
+    app.config['DB_POOL_IDLE_TIMEOUT'] = int(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+    app.config['DB_POOL_MAX_LIFETIME'] = int(os.getenv('DB_POOL_MAX_LIFETIME', 1800))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 10))
+    app.config['DB_POOL_WARM'] = int(os.getenv('DB_POOL_WARM', 0))  # connections to pre-open per worker
+
+    # Optional read replica: read-only statements are routed there automatically
+    app.config['DB_REPLICA_HOST'] = os.getenv('DB_REPLICA_HOST')
+    app.config['DB_REPLICA_PORT'] = int(os.getenv('DB_REPLICA_PORT', app.config['MYSQL_PORT']))
+    app.config['DB_REPLICA_STICKY_SECONDS'] = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+    app.config['DB_REPLICA_RETRY_SECONDS'] = int(os.getenv('DB_REPLICA_RETRY_SECONDS', 5))  # back-off after a failure
+
+    # One pool, one driver: both schemas live on the same host, so each checkout
+    # just selects the schema it needs instead of holding a connection per schema
+    _pool = _create_pool(app.config)
+    if app.config['DB_REPLICA_HOST']:
+        _replica_pool = _create_pool(app.config, host=app.config['DB_REPLICA_HOST'],
+                                     port=app.config['DB_REPLICA_PORT'])
+        _replica_sticky_seconds = app.config['DB_REPLICA_STICKY_SECONDS']
+        _replica_retry_seconds = app.config['DB_REPLICA_RETRY_SECONDS']
+    _login_schema = app.config['MYSQL_DB']
+    _expense_schema = app.config['MYSQL_SECOND_DB']
+
+    # Hand the request's login connection back to the pool when the request ends
+    app.teardown_appcontext(release_db_connection)
+
+    # Pre-open connections in this process, and again in every forked worker
+    # (gunicorn --preload forks after create_app() has already run). A process
+    # that forks is the pre-fork master: it never serves requests, so its pools
+    # are drained first instead of holding warm connections for its whole life.
+    warm_count = app.config['DB_POOL_WARM']
+    for pool in _all_pools():
+        _start_warmup(pool, warm_count)
+    os.register_at_fork(before=_drain_before_fork,
+                        after_in_child=lambda: _rewarm_after_fork(warm_count))
 
     return app
 
+def _pool_options(config):
+    return dict(
+        min_size=config['DB_POOL_MIN'],
+        max_size=config['DB_POOL_MAX'],
+        idle_timeout=config['DB_POOL_IDLE_TIMEOUT'],
+        max_lifetime=config['DB_POOL_MAX_LIFETIME'],
+        timeout=config['DB_POOL_TIMEOUT'],
+    )
+
+def _create_pool(config, host=None, port=None):
+    # Connection params are resolved once here, not on every checkout
+    params = dict(
+        host=host or config['MYSQL_HOST'],
+        port=port or config['MYSQL_PORT'],
+        user=config['MYSQL_USER'],
+        password=config['MYSQL_PASSWORD'],
+        ssl_ca=config.get('MYSQL_SSL_CA'),
+    )
+    return ConnectionPool(lambda: mysql_connector.connect(**params), **_pool_options(config))
+
+def _start_warmup(pool, count):
+    if count <= 0:
+        pool.mark_ready()
+        return
+
+    def run():
+        delay = 1
+        while True:
+            try:
+                pool.warm(count)
+                print(f"🔥 DB pool warmed with {count} connection(s) in worker {os.getpid()}")
+                return
+            except Exception as e:
+                print(f"[DB ERROR] Pool warm-up failed, retrying in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    threading.Thread(target=run, name="db-pool-warmup", daemon=True).start()
+
+def _all_pools():
+    return [pool for pool in (_pool, _replica_pool) if pool is not None]
+
+def _drain_before_fork():
+    for pool in _all_pools():
+        pool.drain()
+
+def _rewarm_after_fork(count):
+    for pool in _all_pools():
+        pool.reset_after_fork()
+        _start_warmup(pool, count)
+
+def pool_ready():
+    """True once every pool holds its pre-opened connections (always true when warm-up is off)."""
+    pools = _all_pools()
+    return bool(pools) and all(pool.is_ready() for pool in pools)
+
+def pool_stats():
+    stats = _require_pool().stats()
+    if _replica_pool is not None:
+        stats['replica'] = _replica_pool.stats()
+    return stats
+
+def _checkout(schema):
+    if _replica_pool is not None:
+        return RoutingConnection(schema)
+    return _require_pool().acquire(schema)
+
+def _require_pool():
+    if _pool is None:
+        raise RuntimeError("DB pool is not configured; call create_app() first.")
+    return _pool
+
 def get_db_connection():
     """
-    Returns a connection object for the login system (Flask-MySQLdb).
+    Returns the login system connection for the current request.
+    It is checked out lazily on first use and returned to the pool at teardown,
+    so routes must not close it themselves.
     Usage: cursor = get_db_connection().cursor()
     """
-    return mysql.connection
+    conn = g.get('_login_db')
+    if conn is None:
+        conn = _checkout(_login_schema)
+        g._login_db = conn
+    return conn
+
+def release_db_connection(exception=None):
+    """Teardown hook: return the request's login connection (if one was opened) to the pool."""
+    conn = g.pop('_login_db', None)
+    if conn is not None:
+        conn.close()
+
+@contextmanager
+def expense_schema(conn):
+    """
+    Selects the expense schema on the request's login connection for the block,
+    then switches back, so a route holding that connection never checks out a second.
+    Usage: with expense_schema(get_db_connection()) as conn: ...
+    """
+    conn.use(_expense_schema)
+    try:
+        yield conn
+    finally:
+        conn.use(_login_schema)
 
 def get_expense_db_connection():
     """
-    Returns a MySQL Connector connection object for expense system.
+    Returns a pooled connection with the expense schema selected.
+    Calling close() on it returns it to the pool instead of dropping it.
     Usage: cursor = get_expense_db_connection().cursor(dictionary=True)
     """
-    ca_path = os.path.join(os.path.dirname(__file__), 'ca.pem')
-
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            port=int(os.getenv('DB_PORT', 3306)),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME_EXPENSE'),  # e.g., expense_management_tools_database
-            ssl_ca=ca_path if os.path.exists(ca_path) else None
-        )
-        return connection
-    except mysql.connector.Error as err:
+        return _checkout(_expense_schema)
+    except (mysql_connector.Error, PoolExhausted) as err:
         print(f"[DB ERROR] Expense DB connection failed: {err}")
         return None
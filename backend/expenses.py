@@ -0,0 +1,487 @@
+"""
+Expense-schema data access.
+
+Functions here take an open cursor and never commit: the caller owns the
+transaction, so one request maps to exactly one commit.
+"""
+from datetime import datetime
+
+from backend.balances import fetch_columns, member_totals, merge_totals
+from backend.money import to_cents, format_cents, split_evenly
+
+MAX_NAME_LENGTH = 100  # users.name VARCHAR(100)
+MAX_TEXT_LENGTH = 255  # expenses.title / location VARCHAR(255)
+
+
+class TripDeleted(ValueError):
+    """The trip was soft-deleted (e.g. by /delete_history in another session)."""
+
+    def __init__(self):
+        super().__init__("This trip has been deleted.")
+
+
+def check_member_name(name):
+    """Raises ValueError for names the users table would reject or truncate."""
+    if not name:
+        raise ValueError("Name is required.")
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError(f"Name must be at most {MAX_NAME_LENGTH} characters.")
+
+
+def parse_expense(data, members=None):
+    """
+    Validates an /add_expense payload:
+    {title, location, amount, paid_by, distribution: {name: amount_owed}}
+    `distribution` may also be a list of names to split the amount evenly.
+    Amounts come back as integer cents. If `members` is given, every name must belong to it.
+    """
+    title = str(data.get("title", "")).strip()
+    location = str(data.get("location", "")).strip()
+    paid_by = str(data.get("paid_by", "")).strip()
+    distribution = data.get("distribution") or {}
+
+    if not title or not paid_by or not isinstance(distribution, (dict, list)) or not distribution:
+        raise ValueError("Title, amount, payer and distribution are required.")
+    if len(title) > MAX_TEXT_LENGTH or len(location) > MAX_TEXT_LENGTH:
+        raise ValueError(f"Title and location must be at most {MAX_TEXT_LENGTH} characters.")
+
+    amount = to_cents(data.get("amount"))
+    if amount <= 0:
+        raise ValueError("Amount must be greater than zero.")
+
+    if isinstance(distribution, list):
+        names = list(dict.fromkeys(str(name).strip() for name in distribution))
+        shares = dict(zip(names, split_evenly(amount, len(names))))
+    else:
+        shares = {str(name).strip(): to_cents(owed) for name, owed in distribution.items()}
+    if sum(shares.values()) != amount:
+        raise ValueError(f"Total owed ({format_cents(sum(shares.values()))}) "
+                         f"does not match amount ({format_cents(amount)}).")
+
+    for name in (paid_by, *shares):
+        check_member_name(name)
+
+    if members is not None:
+        unknown = sorted(({paid_by} | shares.keys()) - set(members))
+        if unknown:
+            raise ValueError(f"Unknown trip member(s): {', '.join(unknown)}")
+
+    return {"title": title, "location": location, "amount": amount,
+            "paid_by": paid_by, "shares": shares}
+
+
+def get_or_create_trip(cursor, owner_email):
+    """Returns the owner's live trip id, creating the trip if they have none."""
+    cursor.execute(
+        "SELECT id FROM trips WHERE owner_email = %s AND deleted_at IS NULL",
+        (owner_email,)
+    )
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    # uq_trips_live_owner allows one live trip per owner: if a concurrent first
+    # login created it in the meantime, this resolves to that trip's id instead
+    cursor.execute(
+        "INSERT INTO trips (owner_email) VALUES (%s) "
+        "ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)",
+        (owner_email,)
+    )
+    return cursor.lastrowid
+
+
+def bump_trip_version(cursor, trip_id):
+    """
+    Increments the trip's version so cached summaries of it go stale, and holds
+    the trip row lock until commit so a concurrent /delete_history can't slip in.
+    Returns the new version. Raises ValueError if the trip has been deleted.
+    """
+    cursor.execute(
+        "UPDATE trips SET version = LAST_INSERT_ID(version + 1) WHERE id = %s AND deleted_at IS NULL",
+        (trip_id,)
+    )
+    if cursor.rowcount != 1:
+        raise TripDeleted()
+    return cursor.lastrowid
+
+
+def fetch_trip_version(cursor, trip_id):
+    """Returns the trip's current version, or None if it doesn't exist or has been deleted."""
+    cursor.execute("SELECT version FROM trips WHERE id = %s AND deleted_at IS NULL", (trip_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def fetch_member_names(cursor, trip_id):
+    """Returns the trip's member names in the order they were added. Raises TripDeleted."""
+    # Starting from the trip row tells "no members yet" (one NULL row) from "deleted" (no rows)
+    cursor.execute(
+        "SELECT u.name FROM trips t LEFT JOIN users u ON u.trip_id = t.id "
+        "WHERE t.id = %s AND t.deleted_at IS NULL ORDER BY u.id",
+        (trip_id,)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        raise TripDeleted()
+    return [row[0] for row in rows if row[0] is not None]
+
+
+def add_member(cursor, trip_id, name):
+    """
+    Adds a member to the trip. Returns False if the name is already taken
+    (uq_users_trip_name, which also matches names differing only in case or accents).
+    Raises TripDeleted instead of adding members to a deleted trip.
+    """
+    check_member_name(name)
+    # Inserting through the live trip row also share-locks it, so a concurrent
+    # /delete_history can't mark the trip deleted under this insert
+    cursor.execute(
+        "INSERT IGNORE INTO users (trip_id, name) "
+        "SELECT id, %s FROM trips WHERE id = %s AND deleted_at IS NULL",
+        (name, trip_id)
+    )
+    if cursor.rowcount == 1:
+        return True
+    if fetch_trip_version(cursor, trip_id) is None:
+        raise TripDeleted()
+    return False
+
+
+def find_member_name(cursor, trip_id, name):
+    """Returns the stored spelling of the member matching `name` under the column collation, or None."""
+    cursor.execute("SELECT name FROM users WHERE trip_id = %s AND name = %s", (trip_id, name))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def resolve_member_ids(cursor, trip_id, names, create=False):
+    """
+    Returns {name: users.id} for all names in the trip in one SELECT. With `create`
+    (bulk import), missing members are inserted first, in one more round trip.
+    Raises ValueError for unknown names, and for names matching a member only under
+    the column collation (different case or accents).
+    """
+    names = sorted(set(names))
+    placeholders = ", ".join(["%s"] * len(names))
+
+    if create:
+        # Every ignored row still uses up an auto-increment value, hence opt-in
+        cursor.execute(
+            "INSERT IGNORE INTO users (trip_id, name) VALUES " + ", ".join(["(%s, %s)"] * len(names)),
+            [value for name in names for value in (trip_id, name)]
+        )
+    cursor.execute(
+        f"SELECT id, name FROM users WHERE trip_id = %s AND name IN ({placeholders})",
+        [trip_id, *names]
+    )
+    ids = {name: user_id for user_id, name in cursor.fetchall()}
+
+    # The unique key follows the column collation, so "rahul" may have matched an
+    # existing "Rahul" instead of being inserted; refuse rather than guess
+    missing = [name for name in names if name not in ids]
+    if missing and create:
+        raise ValueError(f"Name(s) differ only in case or accents from an existing member: {', '.join(missing)}")
+    if missing:
+        raise ValueError(f"Unknown trip member(s): {', '.join(missing)}")
+    return ids
+
+
+def add_expense(cursor, trip_id, expense):
+    """Inserts one expense and all of its shares; returns the new expense id. Members must exist."""
+    bump_trip_version(cursor, trip_id)
+    ids = resolve_member_ids(cursor, trip_id, [expense["paid_by"], *expense["shares"]])
+
+    # Shares carry the expense's created_at so both rows land in the same monthly partition
+    created_at = datetime.now().replace(microsecond=0)
+    cursor.execute(
+        "INSERT INTO expenses (trip_id, title, amount_cents, paid_by, location, created_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        (trip_id, expense["title"], expense["amount"], ids[expense["paid_by"]], expense["location"], created_at)
+    )
+    expense_id = cursor.lastrowid
+
+    # mysql-connector rewrites this into a single multi-row INSERT
+    cursor.executemany(
+        "INSERT INTO expense_shares (trip_id, expense_id, user_id, owed_cents, created_at) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        [(trip_id, expense_id, ids[name], owed, created_at) for name, owed in expense["shares"].items()]
+    )
+
+    payer_id = ids[expense["paid_by"]]
+    owed = [(ids[name], amount) for name, amount in expense["shares"].items()]
+    apply_balance_deltas(cursor, trip_id, paid=[(payer_id, expense["amount"])], owed=owed)
+    apply_pairwise_deltas(cursor, trip_id, payer_id, owed)
+    return expense_id
+
+
+def add_expenses(cursor, trip_id, batch):
+    """
+    Inserts many parsed expenses with one multi-row INSERT per table and one
+    totals upsert; returns their ids. Missing members are created.
+    """
+    bump_trip_version(cursor, trip_id)
+    ids = resolve_member_ids(cursor, trip_id, [name for e in batch for name in (e["paid_by"], *e["shares"])],
+                             create=True)
+
+    created_at = datetime.now().replace(microsecond=0)
+    cursor.execute(
+        "INSERT INTO expenses (trip_id, title, amount_cents, paid_by, location, created_at) VALUES "
+        + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch)),
+        [value for e in batch
+         for value in (trip_id, e["title"], e["amount"], ids[e["paid_by"]], e["location"], created_at)]
+    )
+    # Ids need not be consecutive (innodb_autoinc_lock_mode = 2, auto_increment_increment > 1),
+    # so read them back. bump_trip_version holds the trip row lock, so no other write can
+    # add rows to this trip until we commit: ours are the trip's rows at created_at from
+    # the first generated id on, in VALUES order.
+    cursor.execute(
+        "SELECT id FROM expenses WHERE trip_id = %s AND created_at = %s AND id >= %s ORDER BY id",
+        (trip_id, created_at, cursor.lastrowid)
+    )
+    expense_ids = [row[0] for row in cursor.fetchall()]
+    if len(expense_ids) != len(batch):
+        raise RuntimeError(f"Expected {len(batch)} new expense ids, found {len(expense_ids)}.")
+
+    shares = [(trip_id, expense_id, ids[name], owed, created_at)
+              for expense_id, e in zip(expense_ids, batch) for name, owed in e["shares"].items()]
+    cursor.execute(
+        "INSERT INTO expense_shares (trip_id, expense_id, user_id, owed_cents, created_at) VALUES "
+        + ", ".join(["(%s, %s, %s, %s, %s)"] * len(shares)),
+        [value for row in shares for value in row]
+    )
+
+    owed_by_payer = {}
+    for e in batch:
+        owed_by_payer.setdefault(ids[e["paid_by"]], []).extend(
+            (ids[name], owed) for name, owed in e["shares"].items()
+        )
+    apply_balance_deltas(
+        cursor, trip_id,
+        paid=[(ids[e["paid_by"]], e["amount"]) for e in batch],
+        owed=[pair for owed in owed_by_payer.values() for pair in owed],
+    )
+    for payer_id, owed in sorted(owed_by_payer.items()):
+        apply_pairwise_deltas(cursor, trip_id, payer_id, owed)
+    return expense_ids
+
+
+def delete_expense(cursor, trip_id, expense_id):
+    """Deletes one of the trip's expenses and its shares and backs them out of the totals. Returns False if missing."""
+    bump_trip_version(cursor, trip_id)  # trip row first, same lock order as add_expense
+    cursor.execute(
+        "SELECT paid_by, amount_cents FROM expenses WHERE id = %s AND trip_id = %s FOR UPDATE",
+        (expense_id, trip_id)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return False
+    paid_by, amount = row
+
+    cursor.execute(
+        "SELECT user_id, owed_cents FROM expense_shares WHERE expense_id = %s AND trip_id = %s",
+        (expense_id, trip_id)
+    )
+    shares = cursor.fetchall()
+
+    owed = [(user_id, -owed_cents) for user_id, owed_cents in shares]
+    apply_balance_deltas(cursor, trip_id, paid=[(paid_by, -amount)], owed=owed)
+    apply_pairwise_deltas(cursor, trip_id, paid_by, owed)
+    # No FK cascade on partitioned tables, so shares go explicitly
+    cursor.execute("DELETE FROM expense_shares WHERE expense_id = %s AND trip_id = %s", (expense_id, trip_id))
+    cursor.execute("DELETE FROM expenses WHERE id = %s AND trip_id = %s", (expense_id, trip_id))
+    return True
+
+
+HISTORY_TABLES = ("expense_shares", "expenses")  # shares first: no FK cascade on partitioned tables
+
+
+def delete_history_batch(cursor, trip_id, table, after_id, batch_size):
+    """
+    Deletes the trip's next `batch_size` rows of `table` with id > `after_id`, walking
+    the (trip_id, id) index so each batch costs O(batch_size) however big the trip is.
+    Returns (rows_deleted, last_id); last_id is None once no rows of the trip remain.
+    Commit between batches to keep lock time and undo per transaction bounded.
+    """
+    cursor.execute(
+        f"SELECT id FROM {table} WHERE trip_id = %s AND id > %s ORDER BY id LIMIT %s",
+        (trip_id, after_id, batch_size)
+    )
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return 0, None
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"DELETE FROM {table} WHERE trip_id = %s AND id IN ({placeholders})", [trip_id, *ids])
+    return cursor.rowcount, ids[-1]
+
+
+def reset_trip_totals(cursor, trip_id):
+    """Clears the trip's running totals and members once its history is gone."""
+    cursor.execute("DELETE FROM pairwise_totals WHERE trip_id = %s", (trip_id,))
+    cursor.execute("DELETE FROM user_balances WHERE trip_id = %s", (trip_id,))
+    cursor.execute("DELETE FROM users WHERE trip_id = %s", (trip_id,))
+
+
+def apply_balance_deltas(cursor, trip_id, paid=(), owed=()):
+    """
+    Adds (user_id, amount) deltas to the trip's user_balances in one upsert statement.
+    Must run in the same transaction as the expense write it mirrors.
+    """
+    deltas = {}
+    for user_id, amount in paid:
+        p, o = deltas.get(user_id, (0, 0))
+        deltas[user_id] = (p + amount, o)
+    for user_id, amount in owed:
+        p, o = deltas.get(user_id, (0, 0))
+        deltas[user_id] = (p, o + amount)
+    if not deltas:
+        return
+
+    cursor.execute(
+        "INSERT INTO user_balances (trip_id, user_id, paid_cents, owed_cents) VALUES "
+        + ", ".join(["(%s, %s, %s, %s)"] * len(deltas))
+        + " ON DUPLICATE KEY UPDATE paid_cents = paid_cents + VALUES(paid_cents),"
+        + " owed_cents = owed_cents + VALUES(owed_cents)",
+        [value for user_id, (p, o) in sorted(deltas.items()) for value in (trip_id, user_id, p, o)]
+    )
+
+
+def apply_pairwise_deltas(cursor, trip_id, payer_id, owed):
+    """
+    Adds (receiver_id, amount) deltas owed to `payer_id` into the trip's pairwise_totals
+    in one upsert. The payer's own share is skipped: nobody owes themselves.
+    """
+    deltas = {}
+    for receiver_id, amount in owed:
+        if receiver_id != payer_id:
+            deltas[receiver_id] = deltas.get(receiver_id, 0) + amount
+    if not deltas:
+        return
+
+    cursor.execute(
+        "INSERT INTO pairwise_totals (trip_id, payer_id, receiver_id, owed_cents) VALUES "
+        + ", ".join(["(%s, %s, %s, %s)"] * len(deltas))
+        + " ON DUPLICATE KEY UPDATE owed_cents = owed_cents + VALUES(owed_cents)",
+        [value for receiver_id, amount in sorted(deltas.items())
+         for value in (trip_id, payer_id, receiver_id, amount)]
+    )
+
+
+def fetch_pairwise_totals(cursor, trip_id):
+    """Returns the trip's [(payer_name, receiver_name, owed_cents)] in primary-key order (no filesort)."""
+    cursor.execute(
+        """
+        SELECT p.name, r.name, t.owed_cents
+        FROM pairwise_totals t
+        JOIN trips tr ON tr.id = t.trip_id AND tr.deleted_at IS NULL
+        JOIN users p ON p.id = t.payer_id
+        JOIN users r ON r.id = t.receiver_id
+        WHERE t.trip_id = %s AND t.owed_cents <> 0
+        ORDER BY t.payer_id, t.receiver_id
+        """,
+        (trip_id,)
+    )
+    return cursor.fetchall()
+
+
+def fetch_member_totals(cursor, trip_id):
+    """Returns the trip's {name: (paid_cents, owed_cents)} from the incrementally maintained user_balances table."""
+    cursor.execute(
+        """
+        SELECT u.name, b.paid_cents, b.owed_cents
+        FROM user_balances b
+        JOIN trips t ON t.id = b.trip_id AND t.deleted_at IS NULL
+        JOIN users u ON u.id = b.user_id
+        WHERE b.trip_id = %s AND (b.paid_cents <> 0 OR b.owed_cents <> 0)
+        """,
+        (trip_id,)
+    )
+    return {name: (int(paid), int(owed)) for name, paid, owed in cursor.fetchall()}
+
+
+def recompute_member_totals(cursor, chunk_size=50_000):
+    """
+    Recomputes {user_id: (paid_cents, owed_cents)} from expenses / expense_shares,
+    walking each table in primary-key chunks so no single query scans everything.
+    """
+    totals = {}
+    for table, user_col, amount_col in (("expenses", "paid_by", "amount_cents"),
+                                        ("expense_shares", "user_id", "owed_cents")):
+        last_id = 0
+        while True:
+            ids, user_ids, cents = fetch_columns(
+                cursor,
+                f"SELECT id, {user_col}, {amount_col} FROM {table} "
+                "WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, chunk_size),
+                width=3,
+            )
+            if not len(ids):
+                break
+            if table == "expenses":
+                merge_totals(totals, member_totals(user_ids, cents, [], []))
+            else:
+                merge_totals(totals, member_totals([], [], user_ids, cents))
+            last_id = int(ids[-1])
+    return totals
+
+
+def check_balances(cursor, chunk_size=50_000):
+    """
+    Compares user_balances with a from-scratch recomputation.
+    Returns [(trip_id, user_id, stored_paid, actual_paid, stored_owed, actual_owed)] in cents
+    for drifted members, skipping soft-deleted trips. Run inside one consistent snapshot
+    so concurrent writes don't show up as drift.
+    """
+    # Members belong to exactly one trip, so per-member totals need no trip key
+    actual = recompute_member_totals(cursor, chunk_size)
+
+    cursor.execute(
+        "SELECT user_id, paid_cents, owed_cents FROM user_balances"
+    )
+    stored = {user_id: (paid, owed) for user_id, paid, owed in cursor.fetchall()}
+
+    drifted = []
+    for user_id in sorted(actual.keys() | stored.keys()):
+        s_paid, s_owed = stored.get(user_id, (0, 0))
+        a_paid, a_owed = actual.get(user_id, (0, 0))
+        if (s_paid, s_owed) != (a_paid, a_owed):
+            drifted.append((user_id, s_paid, a_paid, s_owed, a_owed))
+    if not drifted:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(drifted))
+    cursor.execute(
+        f"""
+        SELECT u.id, u.trip_id, t.deleted_at IS NOT NULL
+        FROM users u JOIN trips t ON t.id = u.trip_id
+        WHERE u.id IN ({placeholders})
+        """,
+        [row[0] for row in drifted]
+    )
+    trips = {user_id: (trip_id, deleted) for user_id, trip_id, deleted in cursor.fetchall()}
+    result = []
+    for row in drifted:
+        trip_id, deleted = trips.get(row[0], (None, False))
+        if not deleted:  # deleted trips are mid-purge: rows vanish batch by batch, which is not drift
+            result.append((trip_id, *row))
+    return result
+
+
+def rebuild_balances(cursor, drift):
+    """
+    Overwrites drifted user_balances rows with the recomputed values and bumps
+    each repaired trip's version, so cached summaries and ETags of it go stale.
+    """
+    rows = [row for row in drift if row[0] is not None]  # skip members that no longer exist
+    if not rows:
+        return
+    trip_ids = sorted({row[0] for row in rows})
+    cursor.execute(
+        f"UPDATE trips SET version = version + 1 WHERE id IN ({', '.join(['%s'] * len(trip_ids))})",
+        trip_ids
+    )
+    cursor.execute(
+        "INSERT INTO user_balances (trip_id, user_id, paid_cents, owed_cents) VALUES "
+        + ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+        + " ON DUPLICATE KEY UPDATE paid_cents = VALUES(paid_cents), owed_cents = VALUES(owed_cents)",
+        [value for trip_id, user_id, _, paid, _, owed in rows for value in (trip_id, user_id, paid, owed)]
+    )
@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from backend.metrics import LatencyWindow
+
+
+class HashPoolSaturated(Exception):
+    """Raised when the hashing pool has no free slot (or a job waited too long)."""
+
+
+# ---------- jobs (run inside the pool processes) ----------
+
+def _hash_job(password, method):
+    started = time.time()
+    result = generate_password_hash(password, method=method)
+    return started, time.time(), result
+
+
+def _verify_job(pwhash, password):
+    started = time.time()
+    result = check_password_hash(pwhash, password)
+    return started, time.time(), result
+
+
+class PasswordHasher:
+    """
+    Runs password hashing/verification in a bounded process pool so that
+    key derivation never blocks the request worker's own CPU.
+
+    At most `max_pending` jobs may be queued or running per process; beyond
+    that, calls fail fast with HashPoolSaturated instead of piling up.
+
+    Every web worker process owns a pool, so by default the host's cores are
+    divided among `web_workers` of them rather than each taking all of them.
+    If a pool process dies (e.g. OOM-killed) the pool is replaced on the next call.
+
+    `method` is any werkzeug hash method ("scrypt:65536:8:1", "pbkdf2:sha256:600000");
+    pick one for the host with `python -m backend.hashing --target-ms 250`.
+    """
+
+    def __init__(self, method=None, workers=None, max_pending=None, timeout=10.0, web_workers=1):
+        self.method = method or "scrypt"
+        self._method_prefix = None  # e.g. "scrypt:32768:8:1", learned from the first hash
+        self.workers = workers or max((os.cpu_count() or 1) // max(web_workers, 1), 1)
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+        self._counts = {"hashed": 0, "verified": 0, "saturated": 0, "pool_restarts": 0}
+        self._counts_lock = threading.Lock()
+        self._hash_latency = LatencyWindow()  # time spent deriving the key
+        self._queue_wait = LatencyWindow()    # submit -> job picked up by a pool process
+
+    def hash(self, password):
+        result = self._submit("hashed", _hash_job, password, self.method)
+        if self._method_prefix is None:
+            self._method_prefix = result.split("$", 1)[0]
+        return result
+
+    def verify(self, pwhash, password):
+        return self._submit("verified", _verify_job, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if `pwhash` was made with different parameters than the configured method."""
+        if self._method_prefix is None:
+            self.hash("")  # learn the expanded parameters werkzeug uses for self.method
+        return pwhash.split("$", 1)[0] != self._method_prefix
+
+    def metrics(self):
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            **counts,
+            "hash_latency": self._hash_latency.summary(),
+            "queue_wait": self._queue_wait.summary(),
+        }
+
+    def _submit(self, kind, job, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count("saturated")
+            raise HashPoolSaturated("Password hashing pool is saturated.")
+        try:
+            submitted = time.time()
+            executor = self._pool()
+            try:
+                future = executor.submit(job, *args)
+                started, finished, result = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                self._count("saturated")
+                raise HashPoolSaturated("Password hashing timed out.")
+            except BrokenProcessPool:
+                # A pool process died; the executor never recovers, so swap in a new one
+                self._replace_broken(executor)
+                raise HashPoolSaturated("Password hashing pool restarted.")
+        finally:
+            self._slots.release()
+
+        self._queue_wait.add(max(started - submitted, 0.0))
+        self._hash_latency.add(finished - started)
+        self._count(kind)
+        return result
+
+    def _pool(self):
+        # Pools don't survive fork, so each worker process creates its own lazily.
+        # forkserver children start from a clean process, not from a threaded web worker
+        # (they do re-import a `python -m <module>` main module; see backend/__main__.py).
+        if self._executor_pid != os.getpid():
+            with self._executor_lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = self._new_executor()
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+
+    def _replace_broken(self, executor):
+        with self._executor_lock:
+            if self._executor is executor:  # another thread may have replaced it already
+                self._executor = self._new_executor()
+                self._count("pool_restarts")
+        executor.shutdown(wait=False)
+
+    def _count(self, key):
+        with self._counts_lock:
+            self._counts[key] += 1
+
+
+# ---------- calibration CLI ----------
+
+def _time_method(method, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        generate_password_hash("calibration-password", method=method)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def calibrate(target_ms, algorithm="scrypt", rounds=3, max_scrypt_log2=17):
+    """
+    Returns (method, measured_ms): the strongest parameters whose median hashing
+    time on this host stays within `target_ms`.
+    """
+    budget = target_ms / 1000
+
+    if algorithm == "scrypt":
+        best = None
+        for log2_n in range(14, max_scrypt_log2 + 1):
+            method = f"scrypt:{2 ** log2_n}:8:1"
+            took = _time_method(method, rounds)
+            print(f"  {method:<24} {took * 1000:8.1f} ms", file=sys.stderr)
+            if took > budget:
+                break
+            best = (method, took)
+        if best is None:
+            best = ("scrypt:16384:8:1", took)  # floor: never go below 2**14
+        return best[0], round(best[1] * 1000, 1)
+
+    if algorithm == "pbkdf2":
+        probe = 100_000
+        took = _time_method(f"pbkdf2:sha256:{probe}", rounds)
+        # Cost is linear in iterations; round down to a tidy 10k step
+        iterations = max(100_000, int(probe * budget / took) // 10_000 * 10_000)
+        method = f"pbkdf2:sha256:{iterations}"
+        return method, round(_time_method(method, rounds) * 1000, 1)
+
+    raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick password hash parameters for this host.")
+    parser.add_argument("--target-ms", type=float, default=250, help="hashing latency budget per password")
+    parser.add_argument("--algorithm", choices=["scrypt", "pbkdf2"], default="scrypt")
+    parser.add_argument("--rounds", type=int, default=3, help="timed runs per candidate (median is used)")
+    args = parser.parse_args()
+
+    method, took = calibrate(args.target_ms, args.algorithm, args.rounds)
+    print(f"# {took} ms per hash on this host (budget {args.target_ms:g} ms)", file=sys.stderr)
+    print(f"PASSWORD_HASH_METHOD={method}")
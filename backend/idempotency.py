@@ -0,0 +1,134 @@
+"""
+Idempotency keys for expense writes.
+
+A client sends `Idempotency-Key: <unique string>` with a write and may retry it
+freely. The key row is claimed inside the write's own transaction and stores
+the response when it commits, so:
+
+- a replay after commit gets the stored response without touching expenses;
+- a replay racing the original blocks on the key row until the original
+  commits, then replays its response;
+- if the original rolls back, the claim goes with it and the retry runs.
+
+Keys are scoped to the account and expire after `ttl` seconds. Expired keys
+are deleted by ExpiredKeySweeper in its own short transactions, never inside a
+write's transaction, so writers don't queue on each other's cleanup locks.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+CLEANUP_BATCH = 100
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a different request."""
+
+
+def request_fingerprint(method, path, body):
+    return hashlib.sha256(b"\0".join([method.encode(), path.encode(), body])).hexdigest()
+
+
+def claim(cursor, owner_email, key, fingerprint, ttl):
+    """
+    Claims `key` for this transaction. Returns None if the caller should run the
+    write, or the stored (status_code, body) to replay. Raises IdempotencyKeyReused
+    if the key belongs to a different request.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters.")
+
+    # Inserts a fresh claim, or takes over an expired one; either way the row
+    # stays locked until this transaction ends (expires_at is assigned last
+    # because MySQL evaluates these assignments left to right)
+    cursor.execute(
+        """
+        INSERT INTO idempotency_keys (owner_email, idem_key, request_hash, expires_at)
+        VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)
+        ON DUPLICATE KEY UPDATE
+            request_hash = IF(expires_at <= NOW(), VALUES(request_hash), request_hash),
+            status_code = IF(expires_at <= NOW(), NULL, status_code),
+            response_body = IF(expires_at <= NOW(), NULL, response_body),
+            expires_at = IF(expires_at <= NOW(), VALUES(expires_at), expires_at)
+        """,
+        (owner_email, key, fingerprint, ttl)
+    )
+    cursor.execute(
+        "SELECT request_hash, status_code, response_body FROM idempotency_keys "
+        "WHERE owner_email = %s AND idem_key = %s",
+        (owner_email, key)
+    )
+    request_hash, status_code, body = cursor.fetchone()
+
+    if request_hash != fingerprint:
+        raise IdempotencyKeyReused(f"{HEADER} was already used for a different request.")
+    if status_code is None:
+        return None  # ours: claims only become visible together with their response
+    return status_code, json.loads(body)
+
+
+def store(cursor, owner_email, key, status_code, body):
+    """Records the response for a claimed key; commit it together with the write."""
+    cursor.execute(
+        "UPDATE idempotency_keys SET status_code = %s, response_body = %s "
+        "WHERE owner_email = %s AND idem_key = %s",
+        (status_code, json.dumps(body), owner_email, key)
+    )
+
+
+class ExpiredKeySweeper:
+    """
+    Deletes expired keys every `interval` seconds from one thread per process,
+    `batch_size` rows per transaction. `connect` returns a pooled connection (or None).
+    """
+
+    def __init__(self, connect, interval=60, batch_size=CLEANUP_BATCH):
+        self._connect = connect
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        # Threads don't survive fork, so each worker process starts its own sweeper
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                threading.Thread(target=self._run, name="idempotency-sweeper", daemon=True).start()
+                self._worker_pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"❌ Idempotency key sweep error: {e}")
+
+    def sweep(self):
+        """Deletes every expired key; returns how many."""
+        conn = self._connect()
+        if conn is None:
+            return 0
+        cursor = conn.cursor()
+        total = 0
+        try:
+            while True:
+                cursor.execute(
+                    "DELETE FROM idempotency_keys WHERE expires_at < NOW() LIMIT %s",
+                    (self.batch_size,)
+                )
+                deleted = cursor.rowcount
+                conn.commit()
+                total += deleted
+                if deleted < self.batch_size:
+                    return total
+        finally:
+            cursor.close()
+            conn.close()
@@ -0,0 +1,151 @@
+"""
+Streaming bulk expense import (CSV or NDJSON).
+
+The request body is read in fixed-size chunks and parsed one row at a time, so
+memory stays flat however large the file is. Valid rows are written in batches
+of `batch_size` with multi-row INSERTs, one commit per batch; invalid rows are
+skipped and reported with their row number. If the database rejects a batch,
+its rows are retried one at a time so only the offending rows fail.
+
+CSV needs a header row with title, location, amount, paid_by, distribution,
+where distribution is "Alice=60;Bob=40" or "Alice;Bob" for an even split.
+NDJSON lines are /add_expense payloads.
+"""
+import csv
+import json
+import time
+import codecs
+
+from backend import expenses
+
+CSV_COLUMNS = ("title", "location", "amount", "paid_by", "distribution")
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_lines(stream, chunk_size=64 * 1024):
+    """Yields decoded lines (keeping "\n") from a binary stream, one chunk at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        pending += decoder.decode(chunk, final=not chunk)
+        *lines, pending = pending.split("\n")  # the tail may be a partial line
+        for line in lines:
+            yield line + "\n"
+        if not chunk:
+            if pending:
+                yield pending
+            return
+
+
+def parse_distribution(value):
+    """'Alice=60;Bob=40' -> {name: amount}; 'Alice;Bob' -> [names] (even split)."""
+    parts = [part.strip() for part in str(value or "").split(";") if part.strip()]
+    if parts and all("=" in part for part in parts):
+        return {name.strip(): owed.strip() for name, owed in (part.split("=", 1) for part in parts)}
+    if any("=" in part for part in parts):
+        raise ValueError("Distribution must be all 'name=amount' or all names.")
+    return parts
+
+
+def iter_csv(lines):
+    """
+    Returns an iterator of (row_number, payload or ValueError) over CSV lines.
+    The header is checked right away; a bad one raises ValueError.
+    """
+    reader = csv.DictReader(lines)
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f"CSV header is missing: {', '.join(missing)}")
+
+    def rows():
+        for row in reader:
+            try:
+                yield reader.line_num, {**row, "distribution": parse_distribution(row["distribution"])}
+            except ValueError as e:
+                yield reader.line_num, e
+    return rows()
+
+
+def iter_ndjson(lines):
+    """Yields (row_number, payload or ValueError) from NDJSON lines; blank lines are skipped."""
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+        except ValueError as e:
+            yield line_num, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(payload, dict):
+            yield line_num, ValueError("Each line must be a JSON object.")
+            continue
+        yield line_num, payload
+
+
+def import_expenses(conn, trip_id, rows, batch_size=500):
+    """
+    Validates and writes (row_number, payload) pairs, committing once per batch.
+    Returns the import report.
+    """
+    started = time.monotonic()
+    report = {"imported": 0, "failed": 0, "errors": []}
+    batch = []
+
+    def fail(row_num, error):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_num, "error": str(error)})
+
+    def write(rows):
+        cursor = conn.cursor()
+        try:
+            expenses.add_expenses(cursor, trip_id, [expense for _, expense in rows])
+            conn.commit()
+            report["imported"] += len(rows)
+        finally:
+            cursor.close()
+
+    def flush():
+        try:
+            write(batch)
+        except expenses.TripDeleted:
+            raise  # no row can succeed; the caller re-resolves the trip
+        except Exception:
+            # Something in the batch was rejected (e.g. a member name clashing by case);
+            # retry row by row so only the bad rows fail
+            conn.rollback()
+            for row_num, expense in batch:
+                try:
+                    write([(row_num, expense)])
+                except Exception as e:
+                    conn.rollback()
+                    fail(row_num, e)
+        batch.clear()
+
+    try:
+        for row_num, payload in rows:
+            if isinstance(payload, Exception):
+                fail(row_num, payload)
+                continue
+            try:
+                batch.append((row_num, expenses.parse_expense(payload)))
+            except ValueError as e:
+                fail(row_num, e)
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    except expenses.TripDeleted:
+        conn.rollback()
+        raise
+    except Exception as e:
+        # Earlier batches are committed; report how far we got instead of losing that
+        conn.rollback()
+        report["aborted"] = str(e)
+
+    seconds = time.monotonic() - started
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round((report["imported"] + report["failed"]) / seconds, 1) if seconds else None
+    return report
@@ -0,0 +1,165 @@
+import os
+import time
+import queue
+import smtplib
+import threading
+
+from backend.metrics import LatencyWindow
+
+
+class EmailOutbox:
+    """
+    Bounded in-process email outbox.
+
+    Requests enqueue and return immediately; one background thread per process
+    drains the queue in batches over a single reused SMTP connection, retrying
+    transient failures with exponential backoff.
+    """
+
+    def __init__(self, host='localhost', port=1025, maxsize=1000, batch_size=20,
+                 max_retries=5, backoff=1.0, max_backoff=60.0, idle_close=30.0, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.idle_close = idle_close
+        self.timeout = timeout
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._smtp = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+        self._counts = {"enqueued": 0, "sent": 0, "failed": 0, "rejected": 0, "retries": 0}
+        self._counts_lock = threading.Lock()
+        self._send_latency = LatencyWindow()   # SMTP send time per message
+        self._queue_latency = LatencyWindow()  # enqueue -> delivered
+
+    # ---------- producer side ----------
+
+    def enqueue(self, msg):
+        """Queue a message for delivery. Returns False (without blocking) if the outbox is full."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((msg, time.monotonic()))
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("enqueued")
+        return True
+
+    def metrics(self):
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            **counts,
+            "send_latency": self._send_latency.summary(),
+            "delivery_latency": self._queue_latency.summary(),
+        }
+
+    # ---------- consumer side ----------
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so each worker process starts its own sender
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                self._smtp = None
+                threading.Thread(target=self._run, name="email-outbox", daemon=True).start()
+                self._worker_pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.idle_close)
+            except queue.Empty:
+                self._disconnect()  # don't hold the relay connection while idle
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                # This is the only sender thread in the process: never let it die
+                print(f"❌ Email outbox error: {e}")
+                self._disconnect()
+
+    def _send_batch(self, batch):
+        pending = list(batch)
+        try:
+            self._deliver(pending)
+        finally:
+            self._count("failed", len(pending))  # left unsent by an unexpected error
+            for _ in batch:
+                self._queue.task_done()
+
+    def _deliver(self, pending):
+        """Sends messages off the front of `pending`, removing each once it is done with."""
+        attempt = 0
+        while pending:
+            msg, queued_at = pending[0]
+            try:
+                started = time.monotonic()
+                self._connection().send_message(msg)
+                done = time.monotonic()
+                self._send_latency.add(done - started)
+                self._queue_latency.add(done - queued_at)
+                self._count("sent")
+                pending.pop(0)
+                attempt = 0
+
+            except smtplib.SMTPRecipientsRefused as e:
+                # Permanent for this message; retrying won't help
+                print(f"❌ Email rejected by relay ({msg['To']}): {e}")
+                self._count("failed")
+                pending.pop(0)
+
+            except (smtplib.SMTPException, OSError) as e:
+                self._disconnect()
+                attempt += 1
+                if attempt > self.max_retries:
+                    print(f"❌ Email sending failed after {self.max_retries} retries ({msg['To']}): {e}")
+                    self._count("failed")
+                    pending.pop(0)
+                    attempt = 0
+                    continue
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                print(f"⚠️ Email relay error, retrying in {delay:.1f}s: {e}")
+                self._count("retries")
+                time.sleep(delay)
+
+            except Exception as e:
+                # Not a relay problem (e.g. a message that can't be serialized): drop just this one
+                print(f"❌ Email could not be sent ({msg['To']}): {e}")
+                self._disconnect()
+                self._count("failed")
+                pending.pop(0)
+                attempt = 0
+
+    def _connection(self):
+        if self._smtp is None:
+            self._smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        return self._smtp
+
+    def _disconnect(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                pass
+
+    def _count(self, key, n=1):
+        with self._counts_lock:
+            self._counts[key] += n
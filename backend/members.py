@@ -0,0 +1,69 @@
+"""
+Server-side trip members.
+
+Members live in the users table (unique per trip); the session only carries the
+trip id. Each process keeps a bounded LRU of every trip's member names so
+membership checks are a dict lookup instead of a query. Entries expire after
+`ttl` seconds so members added through another worker process show up, and an
+unknown name always triggers one reload before it is rejected.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from backend import expenses
+
+
+class MemberCache:
+
+    def __init__(self, max_trips=1024, ttl=30.0):
+        self.max_trips = max_trips
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # trip_id -> (loaded_at, {name: None} in insertion order)
+        self._lock = threading.Lock()
+
+    def names(self, cursor, trip_id):
+        """Returns the trip's member names in the order they were added."""
+        return list(self._load(cursor, trip_id))
+
+    def add(self, cursor, trip_id, name):
+        """
+        Adds a member in the caller's transaction. Returns False if the name is already
+        taken; raises ValueError if the name is empty or too long.
+        """
+        if name in self._load(cursor, trip_id):
+            return False
+        added = expenses.add_member(cursor, trip_id, name)
+        # Reload on next use so the cache holds names exactly as stored, and picks up
+        # members another process added (or a case/accent variant that made this a duplicate)
+        self.invalidate(trip_id)
+        return added
+
+    def require(self, cursor, trip_id, names):
+        """Raises ValueError unless every name is a member of the trip."""
+        unknown = set(names) - self._load(cursor, trip_id).keys()
+        if unknown:
+            unknown -= self._load(cursor, trip_id, refresh=True).keys()
+        if unknown:
+            raise ValueError(f"Unknown trip member(s): {', '.join(sorted(unknown))}")
+
+    def invalidate(self, trip_id):
+        with self._lock:
+            self._entries.pop(trip_id, None)
+
+    def _load(self, cursor, trip_id, refresh=False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(trip_id)
+            if entry and not refresh and now - entry[0] < self.ttl:
+                self._entries.move_to_end(trip_id)
+                return entry[1]
+
+        members = dict.fromkeys(expenses.fetch_member_names(cursor, trip_id))
+        with self._lock:
+            self._entries[trip_id] = (now, members)
+            self._entries.move_to_end(trip_id)
+            while len(self._entries) > self.max_trips:
+                self._entries.popitem(last=False)
+        return members
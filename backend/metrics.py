@@ -0,0 +1,27 @@
+import threading
+from collections import deque
+
+
+class LatencyWindow:
+    """Rolling window of recent durations (seconds) with cheap summary stats."""
+
+    def __init__(self, size=256):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0, "avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return {
+            "count": len(samples),
+            "avg_ms": round(sum(samples) / len(samples) * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "max_ms": round(samples[-1] * 1000, 2),
+        }
@@ -0,0 +1,75 @@
+"""
+Money as 64-bit integer minor units (paise/cents).
+
+All amounts are ints from the request edge to the database (BIGINT columns);
+Decimal only appears while parsing user input, and floats only when
+rendering JSON for the frontend.
+"""
+from decimal import Decimal, InvalidOperation
+
+INT64_MAX = 2 ** 63 - 1
+_CENT = Decimal("0.01")
+
+
+def to_cents(value):
+    """
+    Parses a major-unit amount (int, float, str or Decimal) into integer cents.
+    Floats go through their shortest repr, so 12.34 -> 1234 exactly.
+    Raises ValueError for anything non-finite, negative, finer than a cent
+    (never rounded away) or out of BIGINT range.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if isinstance(value, int):
+        cents = value * 100
+    else:
+        try:
+            amount = Decimal(str(value).strip())
+            if not amount.is_finite() or amount != amount.quantize(_CENT):
+                raise ValueError
+            cents = int(amount * 100)
+        except (InvalidOperation, ValueError, TypeError):
+            raise ValueError(f"Invalid amount: {value!r}")
+    if cents < 0 or cents > INT64_MAX:
+        raise ValueError(f"Invalid amount: {value!r}")
+    return cents
+
+
+def format_cents(cents):
+    """1234 -> '12.34', -5 -> '-0.05'."""
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(cents), 100)
+    return f"{sign}{whole}.{frac:02d}"
+
+
+def to_major(cents):
+    """Integer cents -> float major units, for JSON responses only."""
+    return cents / 100
+
+
+def allocate(total, weights):
+    """
+    Splits `total` cents across `weights` proportionally using the largest-remainder
+    method: every part is an int and the parts always sum to exactly `total`.
+    Ties go to the earlier weight.
+    """
+    weights = list(weights)
+    weight_sum = sum(weights)
+    if not weights or weight_sum <= 0 or any(w < 0 for w in weights):
+        raise ValueError("Weights must be non-negative with a positive sum.")
+
+    parts, remainders = [], []
+    for index, weight in enumerate(weights):
+        share, remainder = divmod(total * weight, weight_sum)
+        parts.append(share)
+        remainders.append((-remainder, index))
+
+    for _, index in sorted(remainders)[:total - sum(parts)]:
+        parts[index] += 1
+    return parts
+
+
+def split_evenly(total, count):
+    """`total` cents split into `count` parts that differ by at most one cent."""
+    return allocate(total, [1] * count)
+
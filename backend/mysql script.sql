@@ -5,59 +5,176 @@ DROP DATABASE IF EXISTS expense_management_tools_database;
 CREATE DATABASE expense_management_tools_database;
 USE expense_management_tools_database;
 
--- ✅ Table: users
+-- ✅ Table: trips (owned by a login account, login_system_emt.login_users_emt.email)
+CREATE TABLE trips (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    owner_email VARCHAR(255) NOT NULL,
+    name VARCHAR(255) NOT NULL DEFAULT 'My Trip',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    deleted_at DATETIME NULL,  -- set by /delete_history; reads skip the trip at once
+    version BIGINT NOT NULL DEFAULT 0,  -- bumped by every expense write; keys the /summary cache
+    live TINYINT AS (IF(deleted_at IS NULL, 1, NULL)) STORED,  -- NULL once deleted (NULLs never clash)
+    UNIQUE KEY uq_trips_live_owner (owner_email, live),  -- one live trip per owner
+    INDEX idx_trips_owner (owner_email, deleted_at, created_at)
+);
+
+-- ✅ Table: trip_purges (background removal of a deleted trip's history, see backend/purge.py)
+CREATE TABLE trip_purges (
+    trip_id INT PRIMARY KEY,
+    requested_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    claimed_by VARCHAR(255) NULL,   -- host:pid of the worker holding the lease
+    heartbeat_at DATETIME NULL,     -- bumped after every batch; stale leases are re-claimed
+    rows_deleted BIGINT NOT NULL DEFAULT 0,
+    finished_at DATETIME NULL,
+    INDEX idx_purges_pending (finished_at, heartbeat_at),
+    FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE
+);
+
+-- ✅ Table: users (trip members; names are unique per trip, not globally)
 CREATE TABLE users (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    name VARCHAR(100) NOT NULL UNIQUE
+    trip_id INT NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    UNIQUE KEY uq_users_trip_name (trip_id, name),
+    FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE
 );
 
+-- ✅ Partitioned history: expenses + expense_shares
+-- Both are RANGE partitioned by month on created_at, so archiving a month is an
+-- EXCHANGE/DROP PARTITION (metadata only) instead of a huge cascading DELETE.
+-- Monthly partitions start at the month the schema is created (see below); run
+-- `python -m backend.partitions ensure` regularly to split later months out of
+-- pmax while it is still empty.
+-- MySQL does not allow foreign keys on partitioned tables: the app deletes shares
+-- explicitly and created_at is part of each primary key.
+
 -- ✅ Table: expenses
 CREATE TABLE expenses (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
+    trip_id INT NOT NULL,
     title VARCHAR(255) NOT NULL,
-    amount DECIMAL(10, 2) NOT NULL,
+    amount_cents BIGINT NOT NULL,  -- integer minor units (paise)
     paid_by INT NOT NULL,
     location VARCHAR(255),
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (paid_by) REFERENCES users(id) ON DELETE CASCADE
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+)
+PARTITION BY RANGE COLUMNS (created_at) (
+    PARTITION pmax VALUES LESS THAN (MAXVALUE)
 );
 
--- ✅ Table: expense_shares
+-- ✅ Table: expense_shares (trip_id and created_at copied from the expense)
 CREATE TABLE expense_shares (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
+    trip_id INT NOT NULL,
     expense_id INT NOT NULL,
     user_id INT NOT NULL,
-    amount_owed DECIMAL(10, 2) NOT NULL,
-    FOREIGN KEY (expense_id) REFERENCES expenses(id) ON DELETE CASCADE,
+    owed_cents BIGINT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+)
+PARTITION BY RANGE COLUMNS (created_at) (
+    PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
+
+-- ✅ First monthly partition = the month the schema is created (no hard-coded year)
+SET @partitions = CONCAT(
+    'PARTITION p', DATE_FORMAT(CURDATE(), '%Y%m'),
+    ' VALUES LESS THAN (', QUOTE(DATE_FORMAT(CURDATE() + INTERVAL 1 MONTH, '%Y-%m-01')), '), ',
+    'PARTITION pmax VALUES LESS THAN (MAXVALUE))'
+);
+SET @sql = CONCAT('ALTER TABLE expenses REORGANIZE PARTITION pmax INTO (', @partitions);
+PREPARE stmt FROM @sql; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+SET @sql = CONCAT('ALTER TABLE expense_shares REORGANIZE PARTITION pmax INTO (', @partitions);
+PREPARE stmt FROM @sql; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+-- ✅ Table: user_balances (running totals, updated by delta in every expense write)
+CREATE TABLE user_balances (
+    trip_id INT NOT NULL,
+    user_id INT NOT NULL,
+    paid_cents BIGINT NOT NULL DEFAULT 0,
+    owed_cents BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (trip_id, user_id),
+    FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
--- ✅ View: Detailed settlements
-CREATE OR REPLACE VIEW user_pairwise_settlements AS
-SELECT
-    p.name AS payer_name,
-    o.name AS receiver_name,
-    e.title AS expense_title,
-    s.amount_owed
-FROM expense_shares s
-JOIN users o ON s.user_id = o.id
-JOIN expenses e ON s.expense_id = e.id
-JOIN users p ON e.paid_by = p.id
-ORDER BY p.name, o.name, e.created_at;
-
--- ✅ View: Total settlements
-CREATE OR REPLACE VIEW user_settlement_totals AS
-SELECT
-    payer_name,
-    receiver_name,
-    SUM(amount_owed) AS total_owed
-FROM user_pairwise_settlements
-GROUP BY payer_name, receiver_name
-ORDER BY payer_name, receiver_name;
-
--- 🔥 Indexes for performance
+-- ✅ Table: pairwise_totals (who owes whom, maintained by delta on every expense write)
+-- Replaces the user_pairwise_settlements / user_settlement_totals views, which did a
+-- 4-way join + filesort + GROUP BY over all of expense_shares on every read.
+CREATE TABLE pairwise_totals (
+    trip_id INT NOT NULL,
+    payer_id INT NOT NULL,
+    receiver_id INT NOT NULL,
+    owed_cents BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (trip_id, payer_id, receiver_id),
+    CHECK (payer_id <> receiver_id),  -- a payer's own share is never owed to anyone
+    FOREIGN KEY (trip_id) REFERENCES trips(id) ON DELETE CASCADE,
+    FOREIGN KEY (payer_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (receiver_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- ✅ Table: idempotency_keys (responses of expense writes, replayed on retry; see backend/idempotency.py)
+CREATE TABLE idempotency_keys (
+    owner_email VARCHAR(255) NOT NULL,
+    idem_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,  -- sha256 of method, path and body
+    status_code SMALLINT NULL,       -- NULL until the write commits
+    response_body TEXT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (owner_email, idem_key),
+    INDEX idx_idempotency_expires (expires_at)
+);
+
+-- 🔥 Indexes for performance (every read/delete is confined to one trip's range)
+CREATE INDEX idx_expenses_trip ON expenses(trip_id, created_at);
+CREATE INDEX idx_shares_trip ON expense_shares(trip_id, user_id);
+-- (trip_id, id): purge batches walk one trip's rows in id order without a filesort
+CREATE INDEX idx_expenses_trip_id ON expenses(trip_id, id);
+CREATE INDEX idx_shares_trip_id ON expense_shares(trip_id, id);
 CREATE INDEX idx_paid_by ON expenses(paid_by);
 CREATE INDEX idx_expense_shares ON expense_shares(expense_id, user_id);
 
+-- 🔍 Query plans: before (old settlement views) vs after (pairwise_totals), for one live trip
+-- backend/tests/test_query_plans.py checks that the "after" query is exactly the one
+-- expenses.fetch_pairwise_totals runs, and captures both plans on SQLite (no MySQL in CI):
+--   before: SEARCH s USING INDEX idx_shares_trip (trip_id=?)
+--           SEARCH r USING INTEGER PRIMARY KEY (rowid=?)
+--           SEARCH e USING PRIMARY KEY (id=?)
+--           SEARCH tr USING INTEGER PRIMARY KEY (rowid=?)
+--           SEARCH p USING INTEGER PRIMARY KEY (rowid=?)
+--           USE TEMP B-TREE FOR GROUP BY
+--   after:  SEARCH tr USING INTEGER PRIMARY KEY (rowid=?)
+--           SEARCH t USING PRIMARY KEY (trip_id=?)
+--           SEARCH p USING INTEGER PRIMARY KEY (rowid=?)
+--           SEARCH r USING INTEGER PRIMARY KEY (rowid=?)
+-- i.e. the old read aggregated every share of the trip through a temporary table, the
+-- new one walks the trip's pairwise_totals primary-key range in order. Run these two
+-- EXPLAINs against MySQL to see its plans ("Using temporary; Using filesort" before).
+-- The old view also returned each payer's own share ("A owes A"); pairwise_totals
+-- never stores those rows, which is the only difference in the results.
+
+-- Before: what user_settlement_totals computed, scoped to one live trip
+EXPLAIN
+SELECT p.name, r.name, SUM(s.owed_cents)
+FROM expense_shares s
+JOIN expenses e ON e.id = s.expense_id
+JOIN trips tr ON tr.id = e.trip_id AND tr.deleted_at IS NULL
+JOIN users p ON p.id = e.paid_by
+JOIN users r ON r.id = s.user_id
+WHERE s.trip_id = 1
+GROUP BY p.name, r.name
+ORDER BY p.name, r.name;
+
+-- After: expenses.fetch_pairwise_totals
+EXPLAIN
+SELECT p.name, r.name, t.owed_cents
+FROM pairwise_totals t
+JOIN trips tr ON tr.id = t.trip_id AND tr.deleted_at IS NULL
+JOIN users p ON p.id = t.payer_id
+JOIN users r ON r.id = t.receiver_id
+WHERE t.trip_id = 1 AND t.owed_cents <> 0
+ORDER BY t.payer_id, t.receiver_id;
+
 -- ✅ Test
 SHOW TABLES;
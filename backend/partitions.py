@@ -0,0 +1,185 @@
+"""
+Monthly partition maintenance for expenses / expense_shares.
+
+    python -m backend.partitions ensure [--months-ahead 3]
+    python -m backend.partitions archive --before 2025-07 [--drop]
+
+`ensure` splits every missing month, from the last bounded partition through
+`--months-ahead` months past the current one, out of the catch-all pmax
+partition. REORGANIZE copies whatever rows pmax holds, so run it ahead of time
+(e.g. daily from cron) while pmax is still empty and it stays metadata-only.
+`archive` moves every month before the cutoff out of the live tables with
+EXCHANGE PARTITION into a standalone <table>_<partition> table (or drops it
+with --drop): no row-by-row DELETE and no undo log growth, however large the
+month is. Only months whose rows all belong to deleted trips are archived:
+user_balances and pairwise_totals still count every row of a live trip, and
+expense deletes and trip purges only look at the live tables.
+"""
+import sys
+import argparse
+from datetime import date
+
+TABLES = ("expenses", "expense_shares")
+CATCH_ALL = "pmax"
+
+
+def _month_start(value, months=0):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def list_partitions(cursor, table):
+    """Returns [(name, upper_bound)] in order; upper_bound is None for pmax."""
+    cursor.execute(
+        """
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """,
+        (table,)
+    )
+    partitions = []
+    for name, description in cursor.fetchall():
+        bound = None if description == "MAXVALUE" else date.fromisoformat(description.strip("'")[:10])
+        partitions.append((name, bound))
+    return partitions
+
+
+def missing_months(partitions, through, start):
+    """
+    Months that need their own partition, oldest first: every month from the end
+    of the last bounded partition through `through`. With no bounded partitions
+    yet, the series begins at `start`.
+    """
+    bounds = [bound for _, bound in partitions if bound is not None]
+    month = max(bounds) if bounds else _month_start(start)
+    months = []
+    while month <= through:
+        months.append(month)
+        month = _month_start(month, 1)
+    return months
+
+
+def ensure_partitions(cursor, months_ahead=3, today=None):
+    """
+    Creates one partition per missing month up to `months_ahead` months past the
+    current one, filling any gap after the last bounded partition.
+    """
+    current = _month_start(today or date.today())
+    through = _month_start(current, months_ahead)
+    created = []
+    for table in TABLES:
+        partitions = list_partitions(cursor, table)
+        start = current
+        if not any(bound for _, bound in partitions):
+            # First run: begin at the oldest row still in pmax so no month is merged into another
+            cursor.execute(f"SELECT MIN(created_at) FROM {table} PARTITION ({CATCH_ALL})")
+            oldest = cursor.fetchone()[0]
+            if oldest is not None:
+                start = min(start, _month_start(oldest))
+
+        months = missing_months(partitions, through, start)
+        if not months:
+            continue
+        # One REORGANIZE for all missing months, so pmax is rewritten at most once
+        cursor.execute(
+            f"ALTER TABLE {table} REORGANIZE PARTITION {CATCH_ALL} INTO ("
+            + "".join(f"PARTITION {partition_name(month)} VALUES LESS THAN "
+                      f"('{_month_start(month, 1):%Y-%m-%d}'), " for month in months)
+            + f"PARTITION {CATCH_ALL} VALUES LESS THAN (MAXVALUE))"
+        )
+        created.extend(f"{table}.{partition_name(month)}" for month in months)
+    return created
+
+
+def has_live_trip_rows(cursor, table, partition=None):
+    """True if `table` (or one of its partitions) holds rows of a trip that is not deleted."""
+    source = f"{table} PARTITION ({partition})" if partition else table
+    cursor.execute(
+        f"SELECT 1 FROM {source} x JOIN trips t ON t.id = x.trip_id AND t.deleted_at IS NULL LIMIT 1"
+    )
+    return cursor.fetchone() is not None
+
+
+def list_archives(cursor):
+    """Returns the <table>_pYYYYMM archive tables left by `archive`."""
+    cursor.execute(
+        "SELECT TABLE_NAME FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME REGEXP %s ORDER BY TABLE_NAME",
+        (f"^({'|'.join(TABLES)})_p[0-9]{{6}}$",)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def archive_partitions(cursor, before, drop=False):
+    """
+    Moves (or drops) every monthly partition whose rows are all older than `before`
+    and all belong to deleted trips. Returns (done, skipped): the archive table names
+    (or dropped partition names), and the partitions kept because a live trip uses them.
+    """
+    cutoff = _month_start(before)
+    done, skipped = [], []
+    for table in TABLES:
+        for name, bound in list_partitions(cursor, table):
+            if bound is None or bound > cutoff:
+                continue
+            # Old months never gain rows and deleted trips stay deleted, so this can't go stale
+            if has_live_trip_rows(cursor, table, name):
+                skipped.append(f"{table}.{name}")
+                continue
+            if drop:
+                cursor.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+                done.append(f"{table}.{name}")
+                continue
+            archive = f"{table}_{name}"
+            cursor.execute(f"CREATE TABLE {archive} LIKE {table}")
+            cursor.execute(f"ALTER TABLE {archive} REMOVE PARTITIONING")
+            cursor.execute(f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {archive}")
+            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {name}")  # now empty
+            done.append(archive)
+    return done, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain monthly expense partitions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ensure = commands.add_parser("ensure", help="create upcoming monthly partitions")
+    ensure.add_argument("--months-ahead", type=int, default=3)
+
+    archive = commands.add_parser("archive", help="move old months out of the live tables")
+    archive.add_argument("--before", required=True, help="YYYY-MM; months before this are archived")
+    archive.add_argument("--drop", action="store_true", help="drop the rows instead of keeping an archive table")
+    args = parser.parse_args(argv)
+
+    from backend.db_config import create_app, get_expense_db_connection
+    create_app()
+    conn = get_expense_db_connection()
+    if conn is None:
+        print("❌ Expense DB unavailable.")
+        return 2
+
+    cursor = conn.cursor()
+    try:
+        if args.command == "ensure":
+            created = ensure_partitions(cursor, args.months_ahead)
+            print(f"✅ Created {len(created)} partition(s): {', '.join(created) or '-'}")
+        else:
+            before = date.fromisoformat(f"{args.before}-01")
+            done, skipped = archive_partitions(cursor, before, drop=args.drop)
+            print(f"📦 {'Dropped' if args.drop else 'Archived'} {len(done)} partition(s): {', '.join(done) or '-'}")
+            if skipped:
+                print(f"⏭️ Kept {len(skipped)} partition(s) still used by live trips: {', '.join(skipped)}")
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""
+Bounded, health-checked connection pool (driver-agnostic).
+
+`connect` is any zero-argument callable returning a DB-API style connection
+with ping(), rollback(), close() and a settable `database` attribute.
+Benchmark one shared pool against one pool per schema:
+`python -m backend.pool --threads 32`
+"""
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+from collections import deque
+
+
+class PoolExhausted(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class _PoolEntry:
+    """A raw driver connection plus the bookkeeping the pool needs."""
+
+    __slots__ = ('raw', 'created_at', 'last_used', 'schema')
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+        self.schema = None
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled driver connection.
+    Behaves like the underlying connection, except close() hands it back to the pool.
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._checked_out_at = time.monotonic()
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get('_entry')
+        if entry is None:
+            raise AttributeError(f"Connection already returned to pool (accessing {name!r})")
+        return getattr(entry.raw, name)
+
+    def use(self, schema):
+        """Switch the default schema, skipping the round trip if it is already selected."""
+        entry = self._entry
+        if schema and entry.schema != schema:
+            entry.raw.database = schema  # issues COM_INIT_DB (same as USE)
+            entry.schema = schema
+        return self
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool.release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        entry = self.__dict__.get('_entry')
+        if entry is not None:
+            held = time.monotonic() - self._checked_out_at
+            print(f"⚠️ [DB WARNING] Pooled connection leaked (held {held:.1f}s without close()); discarding it.")
+            self._entry = None
+            self._pool._discard(entry)
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe connection pool.
+
+    - keeps at least `min_size` and at most `max_size` connections open
+    - pings a connection before handing it out (pre-ping)
+    - closes connections idle for longer than `idle_timeout` seconds (down to `min_size`)
+    - recycles connections older than `max_lifetime` seconds
+    - hands out an idle connection already on the requested schema when there is
+      one, so a shared pool rarely pays for a schema switch
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, idle_timeout=300,
+                 max_lifetime=1800, timeout=10):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+
+        self._idle = deque()  # left = least recently used, right = most recently used
+        self._size = 0        # open connections (idle + checked out)
+        self._cond = threading.Condition()
+        self._warm = threading.Event()
+        self._draining = False  # set in a pre-fork parent: close connections instead of parking them
+
+    # ---------- checkout / checkin ----------
+
+    def acquire(self, schema=None):
+        """Checks out a connection, with `schema` selected if given."""
+        deadline = time.monotonic() + self.timeout
+        stale = []
+
+        with self._cond:
+            while True:
+                stale.extend(self._reap_locked())
+                if self._idle:
+                    entry = self._pop_idle_locked(schema)
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f"No DB connection free after {self.timeout}s (max {self.max_size})")
+                self._cond.wait(remaining)
+
+        for old in stale:
+            self._close_raw(old)
+
+        if entry is not None and not self._is_usable(entry):
+            self._close_raw(entry)
+            entry = None
+        if entry is None:
+            entry = self._open()
+
+        return PooledConnection(self, entry).use(schema)
+
+    def release(self, entry):
+        try:
+            # Never hand an open transaction to the next borrower
+            entry.raw.rollback()
+        except Exception:
+            self._discard(entry)
+            return
+
+        now = time.monotonic()
+        if self._draining or now - entry.created_at >= self.max_lifetime:
+            self._discard(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    # ---------- warm-up ----------
+
+    def warm(self, count, query='SELECT 1'):
+        """Open up to `count` connections, run `query` on each and park them idle."""
+        held = []
+        try:
+            for _ in range(min(count, self.max_size)):
+                conn = self.acquire()
+                held.append(conn)
+                cursor = conn.cursor()
+                cursor.execute(query)
+                cursor.fetchall()
+                cursor.close()
+        finally:
+            for conn in held:
+                conn.close()
+        self._warm.set()
+
+    def mark_ready(self):
+        self._warm.set()
+
+    def is_ready(self):
+        return self._warm.is_set()
+
+    def drain(self):
+        """
+        Close every idle connection now, and from here on close connections on
+        release instead of parking them (e.g. still-running warm-up checkouts).
+        """
+        with self._cond:
+            self._draining = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_raw(entry)
+
+    def reset_after_fork(self):
+        """Forget connections inherited from the parent; their sockets belong to it."""
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._warm = threading.Event()
+        self._draining = False
+
+    # ---------- internals ----------
+
+    def _open(self):
+        try:
+            return _PoolEntry(self._connect())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _is_usable(self, entry):
+        if time.monotonic() - entry.created_at >= self.max_lifetime:
+            return False
+        try:
+            entry.raw.ping()
+            return True
+        except Exception:
+            return False
+
+    def _pop_idle_locked(self, schema):
+        # Most recently used first (LIFO keeps a hot core and lets the rest go idle),
+        # but skip over connections on another schema when one on `schema` is idle
+        if schema is not None:
+            for index in range(len(self._idle) - 1, -1, -1):
+                if self._idle[index].schema == schema:
+                    entry = self._idle[index]
+                    del self._idle[index]
+                    return entry
+        return self._idle.pop()
+
+    def _reap_locked(self):
+        """Pop idle connections past idle_timeout; caller closes them outside the lock."""
+        reaped = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._idle and self._size > self.min_size and self._idle[0].last_used < cutoff:
+            reaped.append(self._idle.popleft())
+            self._size -= 1
+        return reaped
+
+    def _discard(self, entry):
+        self._close_raw(entry)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_raw(entry):
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            return {"open": self._size, "idle": len(self._idle), "max": self.max_size}
+
+
+# ---------- benchmark CLI ----------
+
+class _SqliteConnection:
+    """
+    Stand-in driver connection backed by SQLite: one file per schema, both attached
+    like schemas on one MySQL server. SQLite has no network, so every call also
+    sleeps for one simulated round trip (--rtt-ms) and connecting for a handshake.
+    """
+
+    handshakes = 0
+    _count_lock = threading.Lock()
+
+    def __init__(self, paths, handshake, rtt):
+        self._rtt = rtt
+        self._database = None
+        with self._count_lock:
+            _SqliteConnection.handshakes += 1
+        time.sleep(handshake)  # TCP + TLS + auth
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        for schema, path in paths.items():
+            self._db.execute("ATTACH DATABASE ? AS " + schema, (path,))
+
+    @property
+    def database(self):
+        return self._database
+
+    @database.setter
+    def database(self, schema):
+        time.sleep(self._rtt)  # COM_INIT_DB
+        self._db.execute(f"SELECT 1 FROM {schema}.sqlite_master LIMIT 1").fetchall()
+        self._database = schema
+
+    def query(self, key):
+        time.sleep(self._rtt)
+        return self._db.execute(f"SELECT payload FROM {self._database}.items WHERE id = ?", (key,)).fetchone()
+
+    def ping(self):
+        time.sleep(self._rtt)
+        self._db.execute("SELECT 1").fetchone()
+
+    def rollback(self):
+        time.sleep(self._rtt)
+        self._db.rollback()
+
+    def close(self):
+        self._db.close()
+
+
+def _create_schemas(directory, rows=10_000):
+    paths = {}
+    for schema in ("login", "expense"):
+        paths[schema] = os.path.join(directory, f"{schema}.db")
+        with sqlite3.connect(paths[schema]) as db:
+            db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, payload TEXT NOT NULL)")
+            db.executemany("INSERT INTO items VALUES (?, ?)", ((i, f"{schema}-{i}") for i in range(rows)))
+        db.close()
+    return paths
+
+
+def _run_workload(acquire, threads, requests, login_share, seed=7):
+    """Each request runs one query against the login or the expense schema; returns latencies."""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        mine = []
+        for _ in range(requests):
+            schema = "login" if rng.random() < login_share else "expense"
+            started = time.perf_counter()
+            conn = acquire(schema)
+            try:
+                conn.query(rng.randrange(10_000))
+            finally:
+                conn.close()
+            mine.append(time.perf_counter() - started)
+            time.sleep(rng.random() * 0.002)  # think time between requests
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sorted(latencies)
+
+
+def _bench(name, pools, acquire, args):
+    _SqliteConnection.handshakes = 0
+    latencies = _run_workload(acquire, args.threads, args.requests, args.login_share)
+    opened = sum(pool.stats()["open"] for pool in pools)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<26}: {opened:3d} open, {_SqliteConnection.handshakes:3d} handshakes, "
+          f"p50 {p50 * 1000:6.1f} ms, p99 {p99 * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare one shared pool with one pool per schema.")
+    parser.add_argument("--threads", type=int, default=32, help="concurrent request threads")
+    parser.add_argument("--requests", type=int, default=200, help="requests per thread")
+    parser.add_argument("--max-size", type=int, default=10, help="connection budget per worker")
+    parser.add_argument("--login-share", type=float, default=0.2, help="fraction of requests on the login schema")
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    parser.add_argument("--rtt-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = _create_schemas(directory)
+
+        def connect():
+            return _SqliteConnection(paths, args.handshake_ms / 1000, args.rtt_ms / 1000)
+
+        # Same connection budget either way: one shared pool, or the budget split per schema
+        # (first N each, then 2N shared against N each)
+        pools = []
+        for budget in (args.max_size, args.max_size * 2):
+            shared = ConnectionPool(connect, max_size=budget, timeout=60)
+            _bench(f"shared (max {budget})", [shared], shared.acquire, args)
+
+            half = max(budget // 2, 1)
+            split = {schema: ConnectionPool(connect, max_size=half, timeout=60) for schema in ("login", "expense")}
+            _bench(f"per schema (max {half} each)", split.values(),
+                   lambda schema: split[schema].acquire(schema), args)
+            pools.extend([shared, *split.values()])
+
+        for pool in pools:
+            pool.drain()
@@ -0,0 +1,166 @@
+"""
+Background purge of soft-deleted trips.
+
+/delete_history only marks the trip deleted and queues it here. A worker thread
+per process then removes the trip's expense_shares and expenses rows in
+bounded batches, committing and sleeping between batches so lock waits and
+replication lag stay small. Progress lives in trip_purges, so any worker can
+report it, and a purge whose worker died is picked up again once its lease
+goes stale.
+"""
+import os
+import time
+import queue
+import socket
+import threading
+
+from backend.db_config import get_expense_db_connection
+from backend import expenses
+
+
+class TripPurger:
+
+    def __init__(self, batch_size=1000, batch_sleep=0.05, poll_interval=60, lease_seconds=300):
+        self.batch_size = batch_size
+        self.batch_sleep = batch_sleep
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+
+        self._queue = queue.Queue()
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def worker_id(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    # ---------- request side ----------
+
+    def request(self, cursor, trip_id):
+        """
+        Marks the trip deleted and records a pending purge. Runs in the caller's
+        transaction; call notify() after commit.
+        """
+        cursor.execute("UPDATE trips SET deleted_at = NOW() WHERE id = %s AND deleted_at IS NULL", (trip_id,))
+        cursor.execute("INSERT IGNORE INTO trip_purges (trip_id) VALUES (%s)", (trip_id,))
+
+    def notify(self, trip_id):
+        self.ensure_started()
+        self._queue.put(trip_id)
+
+    def ensure_started(self):
+        # Threads don't survive fork, so each worker process starts its own purger
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, name="trip-purger", daemon=True).start()
+                self._worker_pid = os.getpid()
+
+    # ---------- worker side ----------
+
+    def _run(self):
+        while True:
+            try:
+                trip_ids = [self._queue.get(timeout=self.poll_interval)]
+            except queue.Empty:
+                trip_ids = []
+            try:
+                # Also pick up purges orphaned by a crashed or restarted worker
+                for trip_id in trip_ids + self._stale_purges():
+                    self._purge(trip_id)
+            except Exception as e:
+                print(f"❌ Trip purge error: {e}")
+                time.sleep(self.batch_sleep)
+
+    def _stale_purges(self):
+        conn = get_expense_db_connection()
+        if conn is None:
+            return []
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT trip_id FROM trip_purges
+                WHERE finished_at IS NULL
+                  AND (heartbeat_at IS NULL OR heartbeat_at < NOW() - INTERVAL %s SECOND)
+                """,
+                (self.lease_seconds,)
+            )
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _purge(self, trip_id):
+        conn = get_expense_db_connection()
+        if conn is None:
+            raise RuntimeError("Expense DB unavailable.")
+        cursor = conn.cursor()
+        try:
+            if not self._claim(cursor, trip_id):
+                conn.rollback()
+                return  # finished already, or another worker holds a live lease
+            conn.commit()
+
+            for table in expenses.HISTORY_TABLES:
+                # Keyset over (trip_id, id): no batch rescans rows an earlier batch deleted
+                last_id = 0
+                while True:
+                    deleted, last_id = expenses.delete_history_batch(
+                        cursor, trip_id, table, last_id, self.batch_size
+                    )
+                    if last_id is None:
+                        break
+                    cursor.execute(
+                        "UPDATE trip_purges SET rows_deleted = rows_deleted + %s, heartbeat_at = NOW() "
+                        "WHERE trip_id = %s",
+                        (deleted, trip_id)
+                    )
+                    conn.commit()
+                    time.sleep(self.batch_sleep)
+
+            expenses.reset_trip_totals(cursor, trip_id)
+            cursor.execute("UPDATE trip_purges SET finished_at = NOW() WHERE trip_id = %s", (trip_id,))
+            conn.commit()
+            print(f"🧹 Purged trip #{trip_id}")
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _claim(self, cursor, trip_id):
+        cursor.execute(
+            """
+            UPDATE trip_purges SET claimed_by = %s, heartbeat_at = NOW()
+            WHERE trip_id = %s AND finished_at IS NULL
+              AND (claimed_by = %s OR heartbeat_at IS NULL OR heartbeat_at < NOW() - INTERVAL %s SECOND)
+            """,
+            (self.worker_id, trip_id, self.worker_id, self.lease_seconds)
+        )
+        return cursor.rowcount == 1
+
+
+def purge_progress(cursor, owner_email, limit=5):
+    """Latest purges of the owner's trips, newest first."""
+    cursor.execute(
+        """
+        SELECT p.trip_id, p.rows_deleted, p.requested_at, p.finished_at
+        FROM trip_purges p
+        JOIN trips t ON t.id = p.trip_id
+        WHERE t.owner_email = %s
+        ORDER BY p.requested_at DESC
+        LIMIT %s
+        """,
+        (owner_email, limit)
+    )
+    return [
+        {
+            "trip_id": trip_id,
+            "rows_deleted": rows_deleted,
+            "done": finished_at is not None,
+            "requested_at": requested_at.isoformat() if requested_at else None,
+            "finished_at": finished_at.isoformat() if finished_at else None,
+        }
+        for trip_id, rows_deleted, requested_at, finished_at in cursor.fetchall()
+    ]
@@ -0,0 +1,136 @@
+"""
+Settlement engine: turns per-member paid/owed totals into the smallest
+practical list of "X pays Y" transfers. All amounts are integer cents.
+"""
+import heapq
+
+from backend.money import format_cents, to_major
+
+# The exact search is O(n * 2^n) in pure Python: ~70 ms at 16 non-zero balances,
+# ~0.4 s at 18 and ~2 s at 20. The cutoff is by size only (no time budget), so the
+# same balances always settle the same way in every worker (/summary ETags rely on it).
+EXACT_MAX_MEMBERS = 16
+
+
+def net_balances(totals):
+    """{name: (paid_cents, owed_cents)} -> {name: net cents}; positive means the member is owed money."""
+    return {name: paid - owed for name, (paid, owed) in totals.items()}
+
+
+def settle_greedy(balances):
+    """
+    Minimum-cash-flow matching: repeatedly pay the largest debtor's debt to the
+    largest creditor. Each step settles at least one member, so there are at
+    most n-1 transfers, in O(n log n).
+    Returns [(debtor, creditor, amount)].
+    """
+    # Max-heaps via negated amounts; names break ties so output is deterministic
+    creditors = [(-amount, name) for name, amount in balances.items() if amount > 0]
+    debtors = [(amount, name) for name, amount in balances.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+
+    return transfers
+
+
+def settle_exact(balances):
+    """
+    Minimum number of transfers. A group that splits into k zero-sum subsets
+    needs n-k transfers, so we maximise k with a bitmask DP over the non-zero
+    balances (dp[mask] = most zero-sum subsets that mask can be split into),
+    then settle each subset greedily.
+    """
+    names = sorted(name for name, amount in balances.items() if amount != 0)
+    n = len(names)
+    if n == 0:
+        return []
+
+    amounts = [balances[name] for name in names]
+    full = (1 << n) - 1
+
+    sums = [0] * (full + 1)
+    dp = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + amounts[low.bit_length() - 1]
+        best = 0
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if dp[mask ^ bit] > best:
+                best = dp[mask ^ bit]
+            rest ^= bit
+        dp[mask] = best + (1 if sums[mask] == 0 else 0)
+
+    # Walk back from the full set; each time we leave a zero-sum mask, the
+    # members removed since the previous one form an independent group
+    groups = []
+    mask, group = full, []
+    while mask:
+        closes_group = sums[mask] == 0
+        target = dp[mask] - (1 if closes_group else 0)
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if dp[mask ^ bit] == target:
+                break
+            rest ^= bit
+        group.append(names[bit.bit_length() - 1])
+        mask ^= bit
+        if sums[mask] == 0:
+            groups.append(group)
+            group = []
+
+    transfers = []
+    for group in groups:
+        transfers.extend(settle_greedy({name: balances[name] for name in group}))
+    return transfers
+
+
+def settle(balances, exact_max_members=EXACT_MAX_MEMBERS):
+    """
+    Exact minimum-transfer settlement for groups of up to `exact_max_members`
+    non-zero balances, greedy above that.
+    """
+    non_zero = sum(1 for amount in balances.values() if amount != 0)
+    if 2 < non_zero <= exact_max_members:
+        return settle_exact(balances)
+    return settle_greedy(balances)
+
+
+def build_summary(totals):
+    """
+    Builds the /summary payload from {name: (paid_cents, owed_cents)}:
+    total_expense, net_contributions and settlements_statements.
+    Cents are converted to major units only here, at the JSON edge.
+    """
+    balances = net_balances(totals)
+    transfers = settle(balances)
+
+    return {
+        "total_expense": to_major(sum(paid for paid, _ in totals.values())),
+        "net_contributions": [
+            {
+                "person": name,
+                "paid": to_major(paid),
+                "should_pay": to_major(owed),
+                "net_balance": to_major(balances[name]),
+            }
+            for name, (paid, owed) in sorted(totals.items())
+        ],
+        "settlements_statements": [
+            f"{debtor} pays {creditor} ₹{format_cents(amount)}" for debtor, creditor, amount in transfers
+        ],
+    }
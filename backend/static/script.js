@@ -11,6 +11,12 @@ const API_BASE = window.location.origin.includes("localhost")
 // ======================================
 let users = new Set(); // Keeps track of added users (names only)
 
+// Last response + ETag per GET endpoint; sent back as If-None-Match so idle refreshes get a 304
+const etagCache = new Map();
+
+// Idempotency-Key of the expense being saved; reused when the same expense is resubmitted after a failure
+let pendingExpense = null;
+
 const authModal = document.getElementById("authModal");
 const toastContainer = document.getElementById("toast-container");
 const summaryDiv = document.getElementById("summary");
@@ -187,6 +193,7 @@ async function logoutUser() {
     if (!res.ok || !result.success) throw new Error();
 
     users.clear();
+    etagCache.clear();
     summaryDiv.innerHTML = "";
     showToast("👋 Logged out successfully!", "success");
     openAuthModal();
@@ -201,7 +208,7 @@ async function logoutUser() {
 // 👥 USER MANAGEMENT
 // ======================================
 
-// Add a new user to the session
+// Add a new member to the current trip
 async function addUser() {
   const nameInput = document.getElementById("newUserName");
   const name = nameInput.value.trim();
@@ -237,14 +244,13 @@ async function addUser() {
 // Load existing users from the backend
 async function loadUsers() {
   try {
-    const res = await fetch(`${API_BASE}/users`, { credentials: "include" });
+    const { res, data } = await fetchCached("/users");
 
     if (res.status === 401) {
       openAuthModal();
       return showToast("⚠ Session expired. Please login again.", "error");
     }
 
-    const data = await res.json();
     if (!res.ok || !Array.isArray(data)) throw new Error(`HTTP ${res.status}`);
 
     users = new Set(data.map((u) => u.name));
@@ -285,46 +291,71 @@ function renderUserList() {
 // ======================================
 // 💸 ADD EXPENSE
 // ======================================
+
+// Parse a rupee string like "12.3" into integer paise (NaN if invalid)
+function toCents(value) {
+  const match = /^\s*(\d+)(?:\.(\d{0,2}))?\s*$/.exec(String(value));
+  if (!match) return NaN;
+  return parseInt(match[1], 10) * 100 + parseInt((match[2] || "").padEnd(2, "0"), 10);
+}
+
+// Integer paise -> "12.30"
+function formatCents(cents) {
+  return (cents / 100).toFixed(2);
+}
+
 document.getElementById("expenseForm").addEventListener("submit", async function (e) {
   e.preventDefault();
 
   const title = this.title.value.trim();
   const location = this.location.value.trim();
-  const amount = parseFloat(this.amount.value.trim());
+  const amountCents = toCents(this.amount.value.trim());
   const paidBy = this.paid_by.value.trim();
 
-  if (!title || !location || isNaN(amount) || !paidBy || users.size === 0) {
+  if (!title || !location || isNaN(amountCents) || !paidBy || users.size === 0) {
     return showToast("⚠ Fill all fields & add users.", "error");
   }
 
-  const distribution = {};
+  // All arithmetic in integer cents: sums are exact, no float drift to tolerate
+  const owedCents = {};
   let valid = true;
 
   document.querySelectorAll(".owed-input").forEach((input) => {
     const user = input.dataset.username;
-    const owed = parseFloat(input.value);
-    if (isNaN(owed)) valid = false;
-    distribution[user] = owed || 0;
+    const cents = toCents(input.value);
+    if (isNaN(cents)) valid = false;
+    owedCents[user] = cents || 0;
   });
 
-  const totalOwed = Object.values(distribution).reduce((sum, val) => sum + val, 0);
-  if (Math.abs(totalOwed - amount) > 0.01) {
-    return showToast(`⚠ Total owed (${totalOwed}) ≠ Total amount (${amount})`, "error");
+  if (!valid) return showToast("⚠ Enter valid owed amounts.", "error");
+
+  const totalOwedCents = Object.values(owedCents).reduce((sum, val) => sum + val, 0);
+  if (totalOwedCents !== amountCents) {
+    return showToast(`⚠ Total owed (${formatCents(totalOwedCents)}) ≠ Total amount (${formatCents(amountCents)})`, "error");
   }
 
-  if (!valid) return showToast("⚠ Enter valid owed amounts.", "error");
+  // Wire format stays in rupees with exactly 2 decimals; the backend parses them back to cents
+  const amount = amountCents / 100;
+  const distribution = {};
+  Object.entries(owedCents).forEach(([user, cents]) => { distribution[user] = cents / 100; });
+
+  const body = JSON.stringify({ title, location, amount, paid_by: paidBy, distribution });
+  if (!pendingExpense || pendingExpense.body !== body) {
+    pendingExpense = { body, key: crypto.randomUUID() };
+  }
 
   try {
     const res = await fetch(`${API_BASE}/add_expense`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: { "Content-Type": "application/json", "Idempotency-Key": pendingExpense.key },
       credentials: "include",
-      body: JSON.stringify({ title, location, amount, paid_by: paidBy, distribution }),
+      body,
     });
 
     const result = await res.json();
     if (!res.ok || !result.success) throw new Error(result.error || res.status);
 
+    pendingExpense = null;
     showToast("✅ Expense saved!", "success");
     this.reset();
     updatePaidByDropdown();
@@ -336,19 +367,42 @@ document.getElementById("expenseForm").addEventListener("submit", async function
   }
 });
 
+// ======================================
+// 🏷️ CONDITIONAL GET (ETag / If-None-Match)
+// ======================================
+
+// GET a JSON endpoint, reusing the cached body when the server answers 304 Not Modified
+async function fetchCached(path) {
+  const cached = etagCache.get(path);
+  const headers = cached ? { "If-None-Match": cached.etag } : {};
+
+  const res = await fetch(`${API_BASE}${path}`, { credentials: "include", cache: "no-store", headers });
+  if (res.status === 304 && cached) {
+    return { res: { ok: true, status: 200 }, data: cached.data };
+  }
+
+  const data = await res.json();
+  const etag = res.headers.get("ETag");
+  if (res.ok && etag) {
+    etagCache.set(path, { etag, data });
+  } else {
+    etagCache.delete(path);
+  }
+  return { res, data };
+}
+
 // ======================================
 // 📊 LOAD SUMMARY DATA
 // ======================================
 async function loadSummary() {
   try {
-    const res = await fetch(`${API_BASE}/summary`, { credentials: "include" });
+    const { res, data } = await fetchCached("/summary");
 
     if (res.status === 401) {
       openAuthModal();
       return showToast("⚠ Session expired. Please login again.", "error");
     }
 
-    const data = await res.json();
     if (!res.ok || data.success === false) {
       summaryDiv.innerHTML = "<p>❌ Failed to load summary.</p>";
       return;
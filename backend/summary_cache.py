@@ -0,0 +1,50 @@
+"""
+Per-process cache of computed /summary payloads.
+
+Every expense write bumps trips.version in the same transaction, so a summary
+cached under (trip_id, version) is valid for exactly as long as that version is
+current. Each trip holds at most one entry: a newer version replaces it, and
+writes in this process drop it at once. Other processes never see the old
+version again, so their stale entries just age out of the LRU.
+"""
+import threading
+from collections import OrderedDict
+
+
+class SummaryCache:
+
+    def __init__(self, max_trips=1024):
+        self.max_trips = max_trips
+
+        self._entries = OrderedDict()  # trip_id -> (version, summary)
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, trip_id, version):
+        with self._lock:
+            entry = self._entries.get(trip_id)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(trip_id)
+                self._counts["hits"] += 1
+                return entry[1]
+            self._counts["misses"] += 1
+            return None
+
+    def put(self, trip_id, version, summary):
+        with self._lock:
+            entry = self._entries.get(trip_id)
+            if entry and entry[0] > version:
+                return  # a newer version was cached while we computed this one
+            self._entries[trip_id] = (version, summary)
+            self._entries.move_to_end(trip_id)
+            while len(self._entries) > self.max_trips:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, trip_id):
+        with self._lock:
+            if self._entries.pop(trip_id, None) is not None:
+                self._counts["invalidations"] += 1
+
+    def metrics(self):
+        with self._lock:
+            return {"size": len(self._entries), "capacity": self.max_trips, **self._counts}
@@ -0,0 +1,26 @@
+import pytest
+
+from backend.balances import member_totals, merge_totals, _synthetic
+
+
+def test_python_totals():
+    totals = member_totals([1, 2, 1], [500, 300, 100], [1, 2, 3], [200, 400, 300], use_numpy=False)
+    assert totals == {1: (600, 200), 2: (300, 400), 3: (0, 300)}
+
+
+def test_merge_totals_adds_chunks():
+    assert merge_totals({1: (5, 1)}, {1: (1, 2), 2: (0, 3)}) == {1: (6, 3), 2: (0, 3)}
+
+
+@pytest.mark.parametrize("members, shares", [(3, 10), (200, 50_000)])
+def test_numpy_and_python_agree(members, shares):
+    pytest.importorskip("numpy")
+    columns = _synthetic(members, shares)
+    assert member_totals(*columns, use_numpy=True) == member_totals(*columns, use_numpy=False)
+
+
+def test_numpy_totals_stay_exact_past_float64():
+    pytest.importorskip("numpy")
+    big = 2 ** 53 + 1  # not representable as float64
+    columns = ([1, 1], [big, 1], [2], [big])
+    assert member_totals(*columns, use_numpy=True) == {1: (big + 1, 0), 2: (0, big)}
@@ -0,0 +1,102 @@
+import pytest
+
+from backend.batch import run_batch, BatchOperationError
+from backend.expenses import TripDeleted
+
+
+class FakeTripCursor:
+    """Members table with a case-insensitive unique key; expense writes are counted, not stored."""
+
+    def __init__(self, names=()):
+        self.stored = list(names)
+        self.rowcount = 0
+        self.lastrowid = 0
+        self._rows = []
+
+    def _match(self, name):
+        return next((n for n in self.stored if n.casefold() == name.casefold()), None)
+
+    def execute(self, statement, params=None):
+        self._rows = []
+        if statement.startswith("INSERT IGNORE INTO users (trip_id, name) SELECT"):
+            new = [] if self._match(params[0]) else [params[0]]
+            self.stored.extend(new)
+            self.rowcount = len(new)
+        elif statement.startswith("SELECT name FROM users WHERE trip_id = %s AND name ="):
+            match = self._match(params[1])
+            self._rows = [(match,)] if match else []
+        elif statement.startswith("SELECT u.name FROM trips"):
+            self._rows = [(n,) for n in self.stored] or [(None,)]
+        elif statement.startswith("SELECT version FROM trips"):
+            self._rows = [(1,)]
+        elif statement.startswith("SELECT id, name FROM users"):
+            wanted = {n.casefold() for n in params[1:]}
+            self._rows = [(i, n) for i, n in enumerate(self.stored, 1) if n.casefold() in wanted]
+        elif statement.startswith("UPDATE trips"):
+            self.rowcount = 1
+        elif statement.startswith("INSERT INTO expenses"):
+            self.lastrowid += 1
+
+    def executemany(self, statement, seq_params):
+        pass
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+def expense(paid_by, names):
+    return {"op": "add_expense", "title": "Taxi", "amount": "10", "paid_by": paid_by, "distribution": names}
+
+
+def test_members_added_in_batch_can_pay():
+    cursor = FakeTripCursor(["Rahul"])
+    results = run_batch(cursor, 1, [
+        {"op": "add_members", "names": ["Rahul", "Priya"]},
+        expense("Priya", ["Rahul", "Priya"]),
+    ])
+    assert results[0] == {"op": "add_members", "added": ["Priya"], "existing": ["Rahul"]}
+    assert results[1] == {"op": "add_expense", "expense_id": 1}
+
+
+def test_case_variant_member_fails_its_operation():
+    cursor = FakeTripCursor(["Rahul"])
+    with pytest.raises(BatchOperationError) as e:
+        run_batch(cursor, 1, [{"op": "add_members", "names": ["rahul"]}])
+    assert e.value.index == 0
+    assert cursor.stored == ["Rahul"]
+
+
+def test_expense_naming_case_variant_is_a_400_not_a_crash():
+    cursor = FakeTripCursor(["Rahul"])
+    with pytest.raises(BatchOperationError) as e:
+        run_batch(cursor, 1, [expense("rahul", ["rahul"])])
+    assert e.value.index == 0
+
+
+def test_deleted_trip_fails_the_batch_not_an_operation():
+    cursor = FakeTripCursor(["Rahul"])
+    cursor.execute = lambda statement, params=None: setattr(cursor, "_rows", [])  # every trips query misses
+    with pytest.raises(TripDeleted):
+        run_batch(cursor, 1, [{"op": "add_members", "names": ["Priya"]}])
+
+
+def test_expense_looks_members_up_without_inserting():
+    cursor = FakeTripCursor(["Rahul", "Priya"])
+    seen = []
+    execute = cursor.execute
+    cursor.execute = lambda statement, params=None: (seen.append(statement), execute(statement, params))
+    run_batch(cursor, 1, [expense("Priya", ["Rahul", "Priya"])])
+    assert not [statement for statement in seen if statement.startswith("INSERT IGNORE INTO users")]
+
+
+def test_payers_own_share_is_not_owed_to_themselves():
+    cursor = FakeTripCursor(["Rahul", "Priya"])
+    seen = []
+    execute = cursor.execute
+    cursor.execute = lambda statement, params=None: (seen.append((statement, params)), execute(statement, params))
+    run_batch(cursor, 1, [expense("Priya", ["Rahul", "Priya"])])
+    [params] = [params for statement, params in seen if statement.startswith("INSERT INTO pairwise_totals")]
+    assert params == [1, 2, 1, 500]  # trip, payer Priya, receiver Rahul, cents
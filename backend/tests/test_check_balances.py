@@ -0,0 +1,41 @@
+from backend import expenses
+
+
+class FakeSnapshotCursor:
+    """Expenses of two trips; trip 2 is soft-deleted and half purged."""
+
+    def __init__(self):
+        self.expenses = [(1, 10, 500), (2, 20, 900)]          # id, paid_by, amount_cents
+        self.shares = [(1, 10, 500)]                          # id, user_id, owed_cents (trip 2's are gone)
+        self.balances = [(10, 500, 400), (20, 900, 900)]      # user 10 drifted, user 20 is mid-purge
+        self.users = {10: (1, False), 20: (2, True)}          # user_id -> (trip_id, trip deleted)
+        self.statements = []
+        self._rows = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((statement, params))
+        if "FROM expenses WHERE id >" in statement:
+            self._rows = [r for r in self.expenses if r[0] > params[0]][:params[1]]
+        elif "FROM expense_shares WHERE id >" in statement:
+            self._rows = [r for r in self.shares if r[0] > params[0]][:params[1]]
+        elif "FROM user_balances" in statement:
+            self._rows = list(self.balances)
+        elif "FROM users u JOIN trips t" in statement:
+            self._rows = [(u, *self.users[u]) for u in params]
+        else:
+            self._rows = []
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_drift_skips_deleted_trips():
+    cursor = FakeSnapshotCursor()
+    assert expenses.check_balances(cursor) == [(1, 10, 500, 500, 400, 500)]
+
+
+def test_rebuild_bumps_repaired_trip_versions():
+    cursor = FakeSnapshotCursor()
+    expenses.rebuild_balances(cursor, expenses.check_balances(cursor))
+    bumps = [params for statement, params in cursor.statements if statement.startswith("UPDATE trips SET version")]
+    assert bumps == [[1]]
@@ -0,0 +1,125 @@
+import pytest
+from flask import Flask, session
+
+from backend import db_config
+from backend.db_config import RoutingConnection, is_read_only
+from backend.pool import ConnectionPool
+
+
+@pytest.mark.parametrize("statement", [
+    "SELECT name FROM users",
+    "  (SELECT 1) UNION (SELECT 2)",
+    "\nshow tables",
+    "EXPLAIN SELECT 1",
+    "DESC users",
+])
+def test_reads_go_to_the_replica(statement):
+    assert is_read_only(statement)
+
+
+@pytest.mark.parametrize("statement", [
+    "INSERT INTO users (name) VALUES ('a')",
+    "UPDATE trips SET version = version + 1",
+    "SELECT id FROM trips WHERE id = 1 FOR UPDATE",
+    "SELECT id FROM trips WHERE id = 1 FOR SHARE",
+    "SELECT id FROM trips LOCK IN SHARE MODE",
+    "START TRANSACTION WITH CONSISTENT SNAPSHOT",
+    "",
+])
+def test_writes_and_locking_reads_go_to_the_primary(statement):
+    assert not is_read_only(statement)
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, statement, params=None):
+        self._conn.log.append((self._conn.host, statement))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, host, log):
+        self.host = host
+        self.log = log
+        self.database = None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def ping(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FailingConnect:
+
+    def __init__(self):
+        self.attempts = 0
+
+    def __call__(self):
+        self.attempts += 1
+        raise ConnectionError("replica down")
+
+
+@pytest.fixture
+def log(monkeypatch):
+    log = []
+    monkeypatch.setattr(db_config, "_pool", ConnectionPool(lambda: FakeConnection("primary", log)))
+    monkeypatch.setattr(db_config, "_replica_pool", ConnectionPool(lambda: FakeConnection("replica", log)))
+    monkeypatch.setattr(db_config, "_replica_sticky_seconds", 5)
+    monkeypatch.setattr(db_config, "_replica_retry_seconds", 5)
+    monkeypatch.setattr(db_config, "_replica_down_until", 0.0)
+    return log
+
+
+def run(conn, *statements):
+    cursor = conn.cursor()
+    for statement in statements:
+        cursor.execute(statement)
+    cursor.close()
+    conn.close()
+
+
+def test_reads_after_a_write_stay_on_the_primary(log):
+    run(RoutingConnection("expense"), "SELECT 1", "UPDATE trips SET version = 2", "SELECT 2")
+    assert [host for host, _ in log] == ["replica", "primary", "primary"]
+
+
+def test_write_pins_the_session_to_the_primary_across_requests(log):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    with app.test_request_context():
+        run(RoutingConnection("expense"), "INSERT INTO users (name) VALUES ('a')")
+        run(RoutingConnection("login"), "SELECT 1")  # another connection, same request
+        pinned_until = session["_db_primary_until"]
+    with app.test_request_context():
+        session["_db_primary_until"] = pinned_until  # the next request, same cookie
+        run(RoutingConnection("expense"), "SELECT 2")
+    assert [host for host, _ in log] == ["primary", "primary", "primary"]
+
+
+def test_replica_failure_backs_off_to_the_primary(log, monkeypatch):
+    connect = FailingConnect()
+    monkeypatch.setattr(db_config, "_replica_pool", ConnectionPool(connect))
+    for _ in range(3):
+        run(RoutingConnection("expense"), "SELECT 1")
+    assert connect.attempts == 1
+    assert [host for host, _ in log] == ["primary"] * 3
+
+    monkeypatch.setattr(db_config, "_replica_down_until", 0.0)  # back-off elapsed
+    run(RoutingConnection("expense"), "SELECT 1")
+    assert connect.attempts == 2
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from backend.hashing import PasswordHasher, HashPoolSaturated
+
+
+def _die():
+    os._exit(1)  # what an OOM kill looks like to the executor
+
+
+def test_dead_pool_process_is_replaced():
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1)
+    with pytest.raises(HashPoolSaturated):
+        hasher._submit("hashed", _die)
+    assert hasher.verify(hasher.hash("secret"), "secret")
+    assert hasher.metrics()["pool_restarts"] == 1
+
+
+def test_default_workers_split_the_host_between_web_workers():
+    cores = os.cpu_count() or 1
+    assert PasswordHasher(web_workers=cores).workers == 1
+    assert PasswordHasher(web_workers=cores * 4).workers == 1
+    assert PasswordHasher(workers=3, web_workers=cores).workers == 3
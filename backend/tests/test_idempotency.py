@@ -0,0 +1,105 @@
+import pytest
+
+from backend import idempotency
+from backend.idempotency import ExpiredKeySweeper, IdempotencyKeyReused
+
+
+class FakeKeysCursor:
+    """The idempotency_keys table, with a clock the test moves."""
+
+    def __init__(self):
+        self.now = 0
+        self.rows = {}  # (owner, key) -> [request_hash, status_code, body, expires_at]
+        self.rowcount = 0
+        self._row = None
+
+    def execute(self, statement, params=None):
+        if statement.lstrip().startswith("INSERT INTO idempotency_keys"):
+            owner, key, fingerprint, ttl = params
+            row = self.rows.get((owner, key))
+            if row is None or row[3] <= self.now:  # fresh claim, or take over an expired one
+                self.rows[(owner, key)] = [fingerprint, None, None, self.now + ttl]
+        elif statement.startswith("SELECT request_hash"):
+            self._row = tuple(self.rows[params][:3])
+        elif statement.startswith("UPDATE idempotency_keys"):
+            status_code, body, owner, key = params
+            self.rows[(owner, key)][1:3] = [status_code, body]
+        elif statement.startswith("DELETE FROM idempotency_keys"):
+            expired = [k for k, row in self.rows.items() if row[3] < self.now][:params[0]]
+            for k in expired:
+                del self.rows[k]
+            self.rowcount = len(expired)
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+def claim(cursor, fingerprint="a", key="k1"):
+    return idempotency.claim(cursor, "me@example.com", key, fingerprint, ttl=60)
+
+
+def test_first_claim_runs_and_replay_returns_stored_response():
+    cursor = FakeKeysCursor()
+    assert claim(cursor) is None
+    idempotency.store(cursor, "me@example.com", "k1", 200, {"success": True, "expense_id": 7})
+    assert claim(cursor) == (200, {"success": True, "expense_id": 7})
+
+
+def test_key_reused_for_another_request():
+    cursor = FakeKeysCursor()
+    claim(cursor, fingerprint="a")
+    with pytest.raises(IdempotencyKeyReused):
+        claim(cursor, fingerprint="b")
+
+
+def test_expired_key_is_claimed_afresh():
+    cursor = FakeKeysCursor()
+    claim(cursor, fingerprint="a")
+    idempotency.store(cursor, "me@example.com", "k1", 200, {"success": True})
+    cursor.now = 61
+    assert claim(cursor, fingerprint="b") is None
+
+
+@pytest.mark.parametrize("key", ["", "x" * (idempotency.MAX_KEY_LENGTH + 1)])
+def test_bad_keys_are_rejected(key):
+    with pytest.raises(ValueError):
+        claim(FakeKeysCursor(), key=key)
+
+
+def test_store_leaves_expired_keys_to_the_sweeper():
+    cursor = FakeKeysCursor()
+    claim(cursor, key="old")
+    cursor.now = 61
+    claim(cursor, key="new")
+    idempotency.store(cursor, "me@example.com", "new", 200, {"success": True})
+    assert ("me@example.com", "old") in cursor.rows
+
+
+def test_sweeper_deletes_in_batches_each_committed():
+    cursor = FakeKeysCursor()
+    for i in range(5):
+        claim(cursor, key=f"k{i}")
+    cursor.now = 61
+    conn = FakeConnection(cursor)
+    assert ExpiredKeySweeper(lambda: conn, batch_size=2).sweep() == 5
+    assert cursor.rows == {}
+    assert conn.commits == 3
@@ -0,0 +1,89 @@
+import io
+
+import pytest
+
+from backend import importer
+
+
+def lines(data, chunk_size=7):
+    return importer.iter_lines(io.BytesIO(data.encode()), chunk_size=chunk_size)
+
+
+def test_iter_lines_handles_chunk_boundaries_and_bom():
+    data = "\ufeffa,b\r\nccc\nlast"
+    assert list(importer.iter_lines(io.BytesIO(data.encode()), chunk_size=3)) == ["a,b\r\n", "ccc\n", "last"]
+
+
+def test_csv_rows_and_quoted_newlines():
+    data = ('title,location,amount,paid_by,distribution\r\n'
+            'Taxi,Goa,100,Al,"Al=60;Bo=40"\r\n'
+            '"Two\nlines",X,10,Al,Al;Bo\r\n')
+    rows = list(importer.iter_csv(lines(data)))
+    assert rows[0] == (2, {"title": "Taxi", "location": "Goa", "amount": "100", "paid_by": "Al",
+                           "distribution": {"Al": "60", "Bo": "40"}})
+    assert rows[1][1]["title"] == "Two\nlines"
+    assert rows[1][1]["distribution"] == ["Al", "Bo"]
+
+
+def test_csv_header_is_checked_up_front():
+    with pytest.raises(ValueError):
+        importer.iter_csv(lines("title,amount\nTaxi,10\n"))
+
+
+def test_mixed_distribution_is_a_row_error():
+    data = "title,location,amount,paid_by,distribution\nTaxi,,10,Al,Al=5;Bo\n"
+    (row_num, error), = importer.iter_csv(lines(data))
+    assert row_num == 2 and isinstance(error, ValueError)
+
+
+def test_ndjson_reports_bad_lines_and_skips_blank_ones():
+    rows = list(importer.iter_ndjson(lines('{"title": "a"}\n\n[1]\nnot json\n')))
+    assert rows[0] == (1, {"title": "a"})
+    assert [(n, type(e)) for n, e in rows[1:]] == [(3, ValueError), (4, ValueError)]
+
+
+class FakeConn:
+    """Fails any add_expenses call whose batch contains a title in `rejected`."""
+
+    def __init__(self, rejected):
+        self.rejected = rejected
+        self.committed = []
+        self._pending = []
+
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+    def commit(self):
+        self.committed.extend(self._pending)
+        self._pending = []
+
+    def rollback(self):
+        self._pending = []
+
+
+def test_rejected_row_fails_alone(monkeypatch):
+    conn = FakeConn(rejected={"bad"})
+
+    def add_expenses(cursor, trip_id, batch):
+        if any(e["title"] in conn.rejected for e in batch):
+            raise RuntimeError("Data too long")
+        conn._pending.extend(e["title"] for e in batch)
+
+    monkeypatch.setattr(importer.expenses, "add_expenses", add_expenses)
+    rows = [(n, {"title": title, "amount": "1", "paid_by": "A", "distribution": ["A"]})
+            for n, title in enumerate(["a", "bad", "c", "d"], start=1)]
+    report = importer.import_expenses(conn, 1, iter(rows), batch_size=3)
+
+    assert conn.committed == ["a", "c", "d"]
+    assert report["imported"] == 3 and report["failed"] == 1
+    assert report["errors"] == [{"row": 2, "error": "Data too long"}]
+    assert "aborted" not in report
+
+
+def test_overlong_title_is_a_row_error():
+    rows = iter([(1, {"title": "x" * 256, "amount": "1", "paid_by": "A", "distribution": ["A"]})])
+    report = importer.import_expenses(FakeConn(set()), 1, rows)
+    assert report["failed"] == 1 and report["imported"] == 0
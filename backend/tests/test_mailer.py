@@ -0,0 +1,58 @@
+import time
+from email.message import EmailMessage
+
+from backend.mailer import EmailOutbox
+
+
+class FakeSMTP:
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, msg):
+        if msg["Subject"] == "bad":
+            raise ValueError("cannot serialize")
+        self.sent.append(msg["Subject"])
+
+    def quit(self):
+        pass
+
+
+def message(subject):
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["To"] = "me@example.com"
+    msg.set_content("hi")
+    return msg
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_unexpected_error_drops_one_message_and_the_sender_keeps_going():
+    smtp = FakeSMTP()
+    outbox = EmailOutbox(batch_size=1)
+    outbox._connection = lambda: smtp
+    for subject in ("bad", "good", "also good"):
+        assert outbox.enqueue(message(subject))
+    assert wait_for(lambda: outbox.metrics()["sent"] == 2)
+    assert smtp.sent == ["good", "also good"]
+    assert outbox.metrics()["failed"] == 1
+
+
+def test_sender_thread_survives_a_crashing_batch():
+    smtp = FakeSMTP()
+    outbox = EmailOutbox()
+    outbox._connection = lambda: smtp
+    deliver = outbox._deliver
+    outbox._deliver = lambda pending: (_ for _ in ()).throw(RuntimeError("boom"))
+    assert outbox.enqueue(message("lost"))
+    assert wait_for(lambda: outbox.metrics()["failed"] == 1)
+
+    outbox._deliver = deliver
+    assert outbox.enqueue(message("delivered"))
+    assert wait_for(lambda: smtp.sent == ["delivered"])
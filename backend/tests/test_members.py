@@ -0,0 +1,68 @@
+import pytest
+
+from backend.expenses import TripDeleted
+from backend.members import MemberCache
+
+
+class FakeUsersCursor:
+    """Just enough of a cursor for the users table, with a case-insensitive unique key."""
+
+    def __init__(self, names=()):
+        self.stored = list(names)
+        self.deleted = False
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, statement, params=None):
+        if statement.startswith("INSERT IGNORE INTO users"):
+            name = params[0]
+            taken = self.deleted or name.casefold() in {n.casefold() for n in self.stored}
+            if not taken:
+                self.stored.append(name)
+            self.rowcount = 0 if taken else 1
+        elif self.deleted:
+            self._rows = []  # every trips query filters on deleted_at IS NULL
+        elif statement.startswith("SELECT version FROM trips"):
+            self._rows = [(1,)]
+        elif statement.startswith("SELECT u.name FROM trips"):
+            self._rows = [(name,) for name in self.stored] or [(None,)]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_add_then_names_reflect_stored_members():
+    cursor = FakeUsersCursor(["Rahul"])
+    cache = MemberCache()
+    assert cache.add(cursor, 1, "Priya")
+    assert cache.names(cursor, 1) == ["Rahul", "Priya"]
+
+
+def test_case_variant_is_a_duplicate_and_never_cached():
+    cursor = FakeUsersCursor(["Rahul"])
+    cache = MemberCache()
+    assert not cache.add(cursor, 1, "rahul")
+    assert cache.names(cursor, 1) == ["Rahul"]
+    with pytest.raises(ValueError):
+        cache.require(cursor, 1, ["rahul"])
+
+
+def test_overlong_name_is_rejected_before_insert():
+    cursor = FakeUsersCursor()
+    with pytest.raises(ValueError):
+        MemberCache().add(cursor, 1, "x" * 101)
+    assert cursor.stored == []
+
+
+def test_deleted_trip_has_no_members_and_takes_none():
+    cursor = FakeUsersCursor(["Rahul"])
+    cursor.deleted = True
+    cache = MemberCache()
+    with pytest.raises(TripDeleted):
+        cache.names(cursor, 1)
+    with pytest.raises(TripDeleted):
+        cache.add(cursor, 1, "Priya")
+    assert cursor.stored == ["Rahul"]
@@ -0,0 +1,44 @@
+import pytest
+
+from backend.expenses import parse_expense
+from backend.money import allocate, format_cents, split_evenly, to_cents
+
+
+@pytest.mark.parametrize("value, cents", [
+    (12, 1200), ("12", 1200), (12.34, 1234), ("12.34", 1234), ("0.1", 10), ("5.000", 500), (" 7.5 ", 750),
+])
+def test_to_cents_is_exact(value, cents):
+    assert to_cents(value) == cents
+
+
+@pytest.mark.parametrize("value", ["5.001", 0.125, "-1", "nan", "inf", "abc", None, True, 2 ** 63])
+def test_to_cents_rejects(value):
+    with pytest.raises(ValueError):
+        to_cents(value)
+
+
+def test_sub_cent_share_is_not_rounded_into_balance():
+    with pytest.raises(ValueError):
+        parse_expense({"title": "T", "amount": "10", "paid_by": "A", "distribution": {"A": "5", "B": "5.001"}})
+
+
+def test_format_cents():
+    assert [format_cents(c) for c in (1234, 5, -5, 0)] == ["12.34", "0.05", "-0.05", "0.00"]
+
+
+@pytest.mark.parametrize("total, weights", [(100, [1, 1, 1]), (1, [1, 1]), (999, [3, 2, 5]), (0, [1, 2])])
+def test_allocate_parts_sum_to_total(total, weights):
+    parts = allocate(total, weights)
+    assert sum(parts) == total
+    assert all(isinstance(p, int) for p in parts)
+
+
+def test_allocate_gives_leftover_cents_to_earlier_weights():
+    assert allocate(100, [1, 1, 1]) == [34, 33, 33]
+    assert split_evenly(5, 3) == [2, 2, 1]
+
+
+@pytest.mark.parametrize("weights", [[], [0, 0], [1, -1]])
+def test_allocate_rejects_bad_weights(weights):
+    with pytest.raises(ValueError):
+        allocate(100, weights)
@@ -0,0 +1,50 @@
+from datetime import date
+
+from backend.partitions import archive_partitions, missing_months, partition_name
+
+
+def test_first_run_starts_at_given_month():
+    months = missing_months([("pmax", None)], through=date(2026, 12, 1), start=date(2026, 10, 17))
+    assert [partition_name(m) for m in months] == ["p202610", "p202611", "p202612"]
+
+
+def test_fills_gap_after_last_bounded_partition():
+    partitions = [("p202512", date(2026, 1, 1)), ("pmax", None)]
+    months = missing_months(partitions, through=date(2026, 3, 1), start=date(2026, 10, 1))
+    assert [partition_name(m) for m in months] == ["p202601", "p202602", "p202603"]
+
+
+def test_nothing_missing_when_already_ahead():
+    partitions = [("p202611", date(2026, 12, 1)), ("pmax", None)]
+    assert missing_months(partitions, through=date(2026, 11, 1), start=date(2026, 10, 1)) == []
+
+
+class FakePartitionCursor:
+    """Two old months per table; p202501 still holds rows of a live trip."""
+
+    def __init__(self):
+        self.statements = []
+        self._rows = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        if "information_schema.PARTITIONS" in statement:
+            self._rows = [("p202501", "'2025-02-01'"), ("p202502", "'2025-03-01'"), ("pmax", "MAXVALUE")]
+        elif statement.startswith("SELECT 1 FROM"):
+            self._rows = [(1,)] if "PARTITION (p202501)" in statement else []
+        else:
+            self._rows = []
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_archive_keeps_months_used_by_live_trips():
+    cursor = FakePartitionCursor()
+    done, skipped = archive_partitions(cursor, date(2025, 4, 1), drop=True)
+    assert done == ["expenses.p202502", "expense_shares.p202502"]
+    assert skipped == ["expenses.p202501", "expense_shares.p202501"]
+    assert not any("p202501" in s for s in cursor.statements if s.startswith("ALTER"))
@@ -0,0 +1,104 @@
+import pytest
+
+from backend.pool import ConnectionPool, PoolExhausted
+
+
+class FakeConnection:
+    opened = 0
+
+    def __init__(self):
+        FakeConnection.opened += 1
+        self.schema_switches = 0
+        self._database = None
+        self.alive = True
+
+    @property
+    def database(self):
+        return self._database
+
+    @database.setter
+    def database(self, schema):
+        self.schema_switches += 1
+        self._database = schema
+
+    def ping(self):
+        if not self.alive:
+            raise ConnectionError("gone")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.alive = False
+
+
+@pytest.fixture(autouse=True)
+def reset_counter():
+    FakeConnection.opened = 0
+
+
+def test_connections_are_reused_and_schema_switch_is_skipped():
+    pool = ConnectionPool(FakeConnection, max_size=2)
+    first = pool.acquire().use("expense")
+    raw = first._entry.raw
+    first.close()
+    again = pool.acquire().use("expense")
+    assert again._entry.raw is raw
+    assert raw.schema_switches == 1
+    again.close()
+    assert FakeConnection.opened == 1
+
+
+def test_checkout_is_bounded():
+    pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolExhausted):
+        pool.acquire()
+    held.close()
+    pool.acquire().close()
+
+
+def test_dead_connection_is_replaced_on_checkout():
+    pool = ConnectionPool(FakeConnection, max_size=1)
+    conn = pool.acquire()
+    conn._entry.raw.alive = False
+    conn.close()
+    fresh = pool.acquire()
+    assert fresh._entry.raw.alive
+    assert FakeConnection.opened == 2
+    fresh.close()
+
+
+def test_drain_closes_idle_and_in_flight_connections():
+    pool = ConnectionPool(FakeConnection, max_size=2)
+    idle = pool.acquire()
+    in_flight = pool.acquire()
+    idle_raw, in_flight_raw = idle._entry.raw, in_flight._entry.raw
+    idle.close()
+
+    pool.drain()  # e.g. a warm-up checkout still running when the master forks
+    assert not idle_raw.alive
+    in_flight.close()
+    assert not in_flight_raw.alive
+    assert pool.stats()["open"] == 0
+
+    pool.reset_after_fork()
+    conn = pool.acquire()
+    raw = conn._entry.raw
+    conn.close()
+    assert raw.alive
+    assert pool.stats()["idle"] == 1
+
+
+def test_idle_connection_on_the_requested_schema_is_preferred():
+    pool = ConnectionPool(FakeConnection, max_size=2)
+    login = pool.acquire("login")
+    expense = pool.acquire("expense")
+    login_raw = login._entry.raw
+    login.close()
+    expense.close()  # most recently used, but on the other schema
+
+    again = pool.acquire("login")
+    assert again._entry.raw is login_raw
+    assert login_raw.schema_switches == 1
+    again.close()
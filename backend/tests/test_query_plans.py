@@ -0,0 +1,98 @@
+"""
+Before/after query plans for the pairwise settlement read.
+
+There is no MySQL server in CI, so the plans are captured with SQLite on a copy
+of the tables and indexes the read touches. The EXPLAINs in `mysql script.sql`
+are checked against the query the app really runs.
+"""
+import re
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from backend import expenses
+
+SCHEMA_SCRIPT = Path(__file__).resolve().parents[1] / "mysql script.sql"
+
+# InnoDB clusters rows on the primary key; WITHOUT ROWID is SQLite's equivalent
+SQLITE_SCHEMA = """
+CREATE TABLE trips (id INTEGER PRIMARY KEY, owner_email TEXT, deleted_at TEXT, version INT DEFAULT 0);
+CREATE TABLE users (id INTEGER PRIMARY KEY, trip_id INT NOT NULL, name TEXT NOT NULL, UNIQUE (trip_id, name));
+CREATE TABLE expenses (
+    id INT, trip_id INT, title TEXT, amount_cents INT, paid_by INT, location TEXT, created_at TEXT,
+    PRIMARY KEY (id, created_at)
+) WITHOUT ROWID;
+CREATE TABLE expense_shares (
+    id INT, trip_id INT, expense_id INT, user_id INT, owed_cents INT, created_at TEXT,
+    PRIMARY KEY (id, created_at)
+) WITHOUT ROWID;
+CREATE TABLE pairwise_totals (
+    trip_id INT, payer_id INT, receiver_id INT, owed_cents INT DEFAULT 0,
+    PRIMARY KEY (trip_id, payer_id, receiver_id)
+) WITHOUT ROWID;
+CREATE INDEX idx_expenses_trip ON expenses(trip_id, created_at);
+CREATE INDEX idx_shares_trip ON expense_shares(trip_id, user_id);
+CREATE INDEX idx_paid_by ON expenses(paid_by);
+CREATE INDEX idx_expense_shares ON expense_shares(expense_id, user_id);
+"""
+
+
+class RecordingCursor:
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((statement, params))
+
+    def fetchall(self):
+        return []
+
+
+def normalize(sql):
+    return " ".join(sql.split())
+
+
+def script_explains():
+    """Returns the statements after each EXPLAIN in the schema script, in order."""
+    script = SCHEMA_SCRIPT.read_text(encoding="utf-8")
+    return [normalize(sql) for sql in re.findall(r"^EXPLAIN\s+(.*?);", script, re.MULTILINE | re.DOTALL)]
+
+
+def app_query():
+    cursor = RecordingCursor()
+    expenses.fetch_pairwise_totals(cursor, 1)
+    [(statement, params)] = cursor.statements
+    assert params == (1,)
+    return normalize(statement).replace("%s", "1")
+
+
+def plan(sql):
+    db = sqlite3.connect(":memory:")
+    try:
+        db.executescript(SQLITE_SCHEMA)
+        return [row[3] for row in db.execute("EXPLAIN QUERY PLAN " + sql)]
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="module")
+def explains():
+    before, after = script_explains()
+    return before, after
+
+
+def test_script_explains_the_query_the_app_runs(explains):
+    assert explains[1] == app_query()
+
+
+def test_before_aggregates_through_a_temporary_btree(explains):
+    steps = plan(explains[0])
+    assert "USE TEMP B-TREE FOR GROUP BY" in steps
+
+
+def test_after_walks_the_pairwise_primary_key(explains):
+    steps = plan(explains[1])
+    assert "SEARCH t USING PRIMARY KEY (trip_id=?)" in steps
+    assert not any("TEMP B-TREE" in step or step.startswith("SCAN") for step in steps)
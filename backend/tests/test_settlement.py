@@ -0,0 +1,75 @@
+import random
+from itertools import combinations
+
+import pytest
+
+from backend.settlement import settle, settle_exact, settle_greedy
+
+
+def random_balances(n, seed):
+    rng = random.Random(seed)
+    amounts = [rng.choice([-1, 1]) * rng.randint(1, 6) * 500 for _ in range(n - 1)]
+    amounts.append(-sum(amounts))
+    return {f"m{i}": amount for i, amount in enumerate(amounts)}
+
+
+def apply(balances, transfers):
+    left = dict(balances)
+    for debtor, creditor, amount in transfers:
+        assert amount > 0
+        left[debtor] += amount
+        left[creditor] -= amount
+    return left
+
+
+def most_zero_sum_groups(amounts):
+    """Brute force: the most disjoint zero-sum groups the amounts split into."""
+    if not amounts:
+        return 0
+    first, rest = amounts[0], amounts[1:]
+    best = 0
+    for size in range(len(rest) + 1):
+        for others in combinations(range(len(rest)), size):
+            if first + sum(rest[i] for i in others) == 0:
+                remaining = [a for i, a in enumerate(rest) if i not in others]
+                best = max(best, 1 + most_zero_sum_groups(remaining))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_exact_is_optimal_and_settles_everyone(seed):
+    balances = random_balances(2 + seed % 7, seed)
+    transfers = settle_exact(balances)
+    assert all(v == 0 for v in apply(balances, transfers).values())
+    non_zero = [a for a in balances.values() if a]
+    assert len(transfers) == len(non_zero) - most_zero_sum_groups(non_zero)
+
+
+def test_exact_beats_greedy_on_independent_pairs():
+    balances = {"A": 500, "B": -500, "C": 300, "D": -300, "E": 700, "F": -700}
+    assert len(settle_exact(balances)) == 3
+    assert len(settle_greedy(balances)) >= 3
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_greedy_settles_in_at_most_n_minus_one(seed):
+    balances = random_balances(30, seed)
+    transfers = settle_greedy(balances)
+    assert all(v == 0 for v in apply(balances, transfers).values())
+    assert len(transfers) <= sum(1 for a in balances.values() if a) - 1
+
+
+def test_settle_uses_greedy_above_the_cap():
+    balances = random_balances(10, 1)
+    assert settle(balances, exact_max_members=5) == settle_greedy(balances)
+    assert settle(balances, exact_max_members=10) == settle_exact(balances)
+
+
+def test_settle_is_deterministic():
+    balances = random_balances(16, 7)
+    assert settle(balances) == settle(dict(reversed(list(balances.items()))))
+
+
+def test_nothing_to_settle():
+    assert settle({}) == []
+    assert settle({"A": 0, "B": 0}) == []
@@ -0,0 +1,33 @@
+import hashlib
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+_SALT = "password-reset"
+
+
+def password_fingerprint(password_hash):
+    """Short digest of the stored hash; changes whenever the password does."""
+    return hashlib.sha256(password_hash.encode("utf-8")).hexdigest()[:16]
+
+
+def make_reset_token(secret_key, email, password_hash):
+    """
+    Signed, self-contained reset token: {email, fingerprint} + issue timestamp.
+    No server-side state, so any worker or node can validate it.
+    """
+    serializer = URLSafeTimedSerializer(secret_key, salt=_SALT)
+    return serializer.dumps({"email": email, "fp": password_fingerprint(password_hash)})
+
+
+def read_reset_token(secret_key, token, max_age):
+    """
+    Returns (email, fingerprint) for a valid token issued within `max_age` seconds,
+    or None if it is forged, malformed or expired.
+    """
+    serializer = URLSafeTimedSerializer(secret_key, salt=_SALT)
+    try:
+        payload = serializer.loads(token, max_age=max_age)
+    except (SignatureExpired, BadSignature):
+        return None
+    if not isinstance(payload, dict) or "email" not in payload or "fp" not in payload:
+        return None
+    return payload["email"], payload["fp"]